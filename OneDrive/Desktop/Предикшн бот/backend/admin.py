@@ -0,0 +1,43 @@
+"""Служебные эндпоинты: пулы и реплики БД, профилировщик SQL, воркер платежей, запуск.
+
+Подключаются к приложению только при admin_routes_enabled (ADMIN_ROUTES_ENABLED,
+по умолчанию выключено) и требуют заголовок X-Internal-Token, как внутренние
+эндпоинты бота: отчеты раскрывают тексты SQL и внутреннее состояние.
+Профилировщик SQL и воркер платежей импортируются при первом обращении.
+"""
+from fastapi import APIRouter, Depends
+
+from .auth import verify_internal_token
+from .database import get_pool_status, replica_router
+from .startup import startup_stats
+
+router = APIRouter(prefix="/internal", dependencies=[Depends(verify_internal_token)])
+
+@router.get("/db/pool")
+async def get_db_pool_metrics():
+    """Состояние пулов соединений с базой данных"""
+    return get_pool_status()
+
+@router.get("/db/replicas")
+async def get_db_replicas():
+    """Доступность и отставание реплик чтения"""
+    return replica_router.snapshot()
+
+@router.get("/db/queries")
+async def get_query_profiles():
+    """Последние отчеты профилировщика SQL и маршруты с нарушениями"""
+    from .query_profiler import query_profiler
+
+    return query_profiler.snapshot()
+
+@router.get("/payments/worker")
+async def get_payment_worker_metrics():
+    """Метрики воркера платежей: истекшие инвойсы, скорость, неисполненные списания"""
+    from .payment_worker import payment_worker_stats
+
+    return payment_worker_stats.snapshot()
+
+@router.get("/startup")
+async def get_startup_metrics():
+    """Время импорта приложения и шагов инициализации воркера"""
+    return startup_stats.snapshot()
@@ -1,16 +1,49 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlmodel import Session
-from jose import JWTError, jwt
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from jose import JWTError
 from datetime import datetime, timedelta
 from typing import Optional
+import hmac
+import time
 
-from .database import get_session
+from .database import get_async_session, user_read_session
 from .models import User
 from .config import settings
+from .cache import TTLCache
 
 security = HTTPBearer()
 
+# Данные пользователя, которые кладутся в токен в stateless-режиме
+USER_CLAIMS = (
+    "first_name", "telegram_id", "zodiac_sign", "predictions_count", "daily_push", "created_at", "updated_at"
+)
+
+# Заголовок ответа с новым токеном: в stateless-режиме выдается после изменения пользователя
+ACCESS_TOKEN_HEADER = "X-Access-Token"
+
+# Кэш проверенных токенов: token -> payload
+token_cache = TTLCache(
+    maxsize=settings.auth_token_cache_size,
+    ttl=settings.access_token_expire_minutes * 60
+)
+
+# Кэш пользователей: user_id -> снимок полей User
+user_cache = TTLCache(
+    maxsize=settings.auth_user_cache_size,
+    ttl=settings.auth_user_cache_ttl_seconds
+)
+
+def _jwt():
+    """jose.jwt импортируется при первом токене: он тянет cryptography (десятки мс на старте).
+
+    После старта воркера модуль загружается фоном (startup.DEFERRED_IMPORTS).
+    """
+    from jose import jwt
+
+    return jwt
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Создание JWT токена"""
     to_encode = data.copy()
@@ -18,49 +51,148 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
-    
+
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm="HS256")
+    encoded_jwt = _jwt().encode(to_encode, settings.secret_key, algorithm="HS256")
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[str]:
-    """Проверка JWT токена и извлечение user_id"""
+def create_user_access_token(user: User) -> str:
+    """Создание токена для пользователя (с его данными в stateless-режиме)"""
+    data = {"sub": user.id}
+    if settings.auth_stateless_tokens:
+        data["user"] = user.model_dump(mode="json", include=set(USER_CLAIMS))
+        data["iat"] = int(time.time())
+    return create_access_token(data=data)
+
+def decode_token(token: str) -> Optional[dict]:
+    """Проверка JWT токена с кэшированием результата до истечения срока"""
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=["HS256"])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            return None
-        return user_id
+        payload = _jwt().decode(token, settings.secret_key, algorithms=["HS256"])
     except JWTError:
         return None
+    # Без exp токен был бы бессрочным: такие не принимаются
+    if payload.get("sub") is None or not isinstance(payload.get("exp"), (int, float)):
+        return None
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    session: Session = Depends(get_session)
-) -> User:
-    """Получение текущего аутентифицированного пользователя"""
-    credentials_exception = HTTPException(
+    token_cache.set(token, payload, ttl=payload["exp"] - time.time())
+    return payload
+
+def reissue_user_token(response: Response, user: User, request: Optional[Request] = None):
+    """Новый токен с актуальными данными пользователя в заголовке ответа.
+
+    Данные в stateless-токене не обновляются сами: маршруты, изменившие
+    пользователя, и get_current_user для устаревших данных выдают новый
+    токен, клиент заменяет им сохраненный. Маршруты, которые сами собирают
+    Response, берут заголовок из request.state.response_headers.
+    """
+    if not settings.auth_stateless_tokens:
+        return
+    token = create_user_access_token(user)
+    response.headers[ACCESS_TOKEN_HEADER] = token
+    if request is not None:
+        request.state.response_headers = {ACCESS_TOKEN_HEADER: token}
+
+def _claims_are_fresh(payload: dict) -> bool:
+    """Данным пользователя из токена доверяем не дольше TTL кэша пользователей"""
+    issued_at = payload.get("iat")
+    return isinstance(issued_at, (int, float)) and time.time() - issued_at < settings.auth_user_cache_ttl_seconds
+
+def verify_token(token: str) -> Optional[str]:
+    """Проверка JWT токена и извлечение user_id"""
+    payload = decode_token(token)
+    if payload is None:
+        return None
+    return payload["sub"]
+
+def invalidate_user_cache(user_id: str):
+    """Сброс кэша пользователя после изменения его данных"""
+    user_cache.pop(user_id)
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    session: AsyncSession = Depends(get_async_session),
+    request: Request = None,
+    response: Response = None
+) -> User:
+    """Получение текущего аутентифицированного пользователя.
+
+    Возвращает отсоединенный от сессии снимок: из токена в stateless-режиме,
+    иначе из кэша пользователей или БД. Данные stateless-токена старше
+    auth_user_cache_ttl_seconds перечитываются из БД, ответ получает новый
+    токен. Для изменения пользователя используйте get_current_user_for_update.
+    """
+    payload = decode_token(credentials.credentials)
+    if payload is None:
+        raise _credentials_exception()
+    user_id = payload["sub"]
+
+    if settings.auth_stateless_tokens and "user" in payload:
+        if _claims_are_fresh(payload):
+            return User.model_validate({"id": user_id, **payload["user"]})
+        # Пользователь мог измениться не через этот клиент (например, покупка в боте)
+        user = await session.get(User, user_id)
+        if user is None:
+            raise _credentials_exception()
+        user_cache.set(user_id, user.model_dump())
+        if response is not None:
+            reissue_user_token(response, user, request)
+        return User.model_validate(user.model_dump())
+
+    snapshot = user_cache.get(user_id)
+    if snapshot is None:
+        user = await session.get(User, user_id)
+        if user is None:
+            raise _credentials_exception()
+        snapshot = user.model_dump()
+        user_cache.set(user_id, snapshot)
+
+    return User.model_validate(snapshot)
+
+async def get_current_user_for_update(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    session: AsyncSession = Depends(get_async_session)
+) -> User:
+    """Текущий пользователь, загруженный в сессию запроса для изменения"""
     user_id = verify_token(credentials.credentials)
     if user_id is None:
-        raise credentials_exception
-    
-    user = session.get(User, user_id)
+        raise _credentials_exception()
+
+    user = await session.get(User, user_id)
     if user is None:
-        raise credentials_exception
-    
+        raise _credentials_exception()
+
     return user
 
-def authenticate_telegram_user(telegram_id: int, session: Session) -> Optional[str]:
+async def get_user_read_session(current_user: User = Depends(get_current_user)):
+    """Сессия для чтения данных текущего пользователя: из реплики, если он ничего не записывал недавно"""
+    async with user_read_session(current_user.id, current_user.updated_at) as session:
+        yield session
+
+async def verify_internal_token(x_internal_token: Optional[str] = Header(default=None)):
+    """Проверка общего секрета для внутренних эндпоинтов бота"""
+    if not settings.internal_api_token or not x_internal_token or not hmac.compare_digest(
+        x_internal_token, settings.internal_api_token
+    ):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+async def authenticate_telegram_user(telegram_id: int, session: AsyncSession) -> Optional[str]:
     """Аутентификация пользователя по Telegram ID и создание токена"""
-    user = session.query(User).filter(User.telegram_id == telegram_id).first()
+    result = await session.exec(select(User).where(User.telegram_id == telegram_id))
+    user = result.first()
     if not user:
         return None
-    
+
     # Создаем токен доступа
-    access_token = create_access_token(data={"sub": user.id})
-    return access_token 
\ No newline at end of file
+    access_token = create_user_access_token(user)
+    return access_token
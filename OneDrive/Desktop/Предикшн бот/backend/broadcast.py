@@ -0,0 +1,39 @@
+from datetime import date
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .models import User, ZodiacSign, BroadcastRecipient
+from .predictions import generate_prediction_for_sign
+
+async def get_broadcast_recipients(
+    session: AsyncSession,
+    limit: int,
+    after_sign: Optional[ZodiacSign] = None,
+    after_id: Optional[str] = None
+) -> List[BroadcastRecipient]:
+    """Пачка подписчиков рассылки, упорядоченных по (zodiac_sign, id)"""
+    statement = select(User.id, User.telegram_id, User.zodiac_sign).where(
+        User.daily_push == True,  # noqa: E712
+        User.zodiac_sign.is_not(None)
+    )
+    if after_sign is not None and after_id is not None:
+        statement = statement.where(
+            or_(
+                User.zodiac_sign > after_sign,
+                and_(User.zodiac_sign == after_sign, User.id > after_id)
+            )
+        )
+    result = await session.exec(
+        statement.order_by(User.zodiac_sign, User.id).limit(limit)
+    )
+    return [
+        BroadcastRecipient(id=user_id, telegram_id=telegram_id, zodiac_sign=zodiac_sign)
+        for user_id, telegram_id, zodiac_sign in result.all()
+    ]
+
+def get_broadcast_texts(day: date) -> Dict[ZodiacSign, str]:
+    """Текст рассылки для каждого знака, рассчитывается один раз на знак"""
+    return {sign: generate_prediction_for_sign(sign, day) for sign in ZodiacSign}
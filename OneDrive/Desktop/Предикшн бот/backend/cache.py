@@ -0,0 +1,84 @@
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Hashable, Optional
+
+from .models import PredictionPublic
+
+class TTLCache:
+    """Ограниченный по размеру LRU-кэш с временем жизни записей"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Запись значения; ttl ограничивает время жизни сверху"""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+class TodayPredictionCache:
+    """Кэш «у пользователя уже есть предсказание на сегодня».
+
+    Хранит только положительные ответы: купленное предсказание на день
+    уже не исчезнет, а отсутствие могло измениться в другом воркере.
+    Кэш целиком сбрасывается на границе суток по UTC.
+    """
+
+    def __init__(self):
+        self._day: Optional[date] = None
+        self._predictions: Dict[str, PredictionPublic] = {}
+
+    def _current(self) -> Dict[str, PredictionPublic]:
+        today = datetime.utcnow().date()
+        if self._day != today:
+            self._day = today
+            self._predictions = {}
+        return self._predictions
+
+    def get(self, user_id: str) -> Optional[PredictionPublic]:
+        return self._current().get(user_id)
+
+    def set(self, user_id: str, prediction) -> PredictionPublic:
+        """Запоминание предсказания, если оно на сегодняшний день"""
+        snapshot = PredictionPublic.model_validate(prediction)
+        predictions = self._current()
+        if snapshot.prediction_date == self._day:
+            predictions[user_id] = snapshot
+        return snapshot
+
+    def clear(self):
+        self._predictions = {}
+
+# Глобальные кэши процесса
+today_predictions = TodayPredictionCache()
+
+# Результаты подтвержденных платежей для повторных подтверждений:
+# payment_id -> (user_id, telegram_payment_id, PredictionPublic)
+confirmed_payments = TTLCache(maxsize=10000, ttl=24 * 60 * 60)
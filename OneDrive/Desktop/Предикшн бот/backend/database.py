@@ -1,18 +1,366 @@
-from sqlmodel import SQLModel, create_engine, Session
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from threading import Lock
+from typing import AsyncIterator, List, Optional
+
+from sqlmodel import create_engine, Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from .config import settings
+from .cache import TTLCache
+from .metrics import Counter, Gauge, instrument_engine
+from .models import ReplicationHeartbeat, User
+
+logger = logging.getLogger(__name__)
+
+def get_async_database_url(database_url: str) -> str:
+    """Преобразование URL базы данных в URL для асинхронного драйвера"""
+    if database_url.startswith("postgresql://"):
+        return database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if database_url.startswith("postgresql+psycopg2://"):
+        return database_url.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+    if database_url.startswith("sqlite://"):
+        return database_url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return database_url
+
+# === МЕТРИКИ ПУЛА ===
+class PoolWaitStats:
+    """Накопительная статистика ожидания соединения из пула"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "total_seconds": round(self.total_seconds, 6),
+                "avg_seconds": round(self.total_seconds / self.count, 6) if self.count else 0.0,
+                "max_seconds": round(self.max_seconds, 6)
+            }
+
+sync_pool_wait_stats = PoolWaitStats()
+async_pool_wait_stats = PoolWaitStats()
+
+class _TimedConnectMixin:
+    """Замер времени получения соединения из пула"""
+    wait_stats: PoolWaitStats
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            self.wait_stats.observe(time.perf_counter() - started)
+
+class TimedQueuePool(_TimedConnectMixin, QueuePool):
+    wait_stats = sync_pool_wait_stats
+
+class TimedAsyncAdaptedQueuePool(_TimedConnectMixin, AsyncAdaptedQueuePool):
+    wait_stats = async_pool_wait_stats
+
+def _engine_options(database_url: str, pool_class, is_async: bool) -> dict:
+    """Параметры пула и соединения для движка"""
+    connect_args = {}
+    if "sqlite" in database_url:
+        if not is_async:
+            connect_args["check_same_thread"] = False
+        if ":memory:" in database_url or database_url.rstrip("/") == "sqlite:":
+            # Для БД в памяти оставляем пул SQLAlchemy по умолчанию
+            return {"connect_args": connect_args}
+    elif settings.database_statement_timeout_ms and database_url.startswith("postgresql"):
+        timeout = str(settings.database_statement_timeout_ms)
+        if is_async:
+            connect_args["server_settings"] = {"statement_timeout": timeout}
+        else:
+            connect_args["options"] = f"-c statement_timeout={timeout}"
+
+    return {
+        "poolclass": pool_class,
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_timeout": settings.database_pool_timeout,
+        "pool_recycle": settings.database_pool_recycle,
+        "pool_pre_ping": settings.database_pool_pre_ping,
+        "connect_args": connect_args
+    }
 
 # Создание движка базы данных
 engine = create_engine(
     settings.database_url,
     echo=settings.database_echo,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
+    **_engine_options(settings.database_url, TimedQueuePool, is_async=False)
+)
+
+# Асинхронный движок для обработчиков запросов (asyncpg / aiosqlite)
+async_engine = create_async_engine(
+    get_async_database_url(settings.database_url),
+    echo=settings.database_echo,
+    **_engine_options(settings.database_url, TimedAsyncAdaptedQueuePool, is_async=True)
+)
+
+# Число запросов и время в БД по HTTP-запросам (см. metrics.py)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+# === РЕПЛИКИ ЧТЕНИЯ ===
+READ_SESSIONS = Counter(
+    "db_read_sessions_total", "Read-only sessions by target database and routing reason", ("target", "reason")
 )
 
-def create_db_and_tables():
-    """Создание всех таблиц в базе данных"""
-    SQLModel.metadata.create_all(engine)
+class Replica:
+    """Асинхронный движок реплики и результат последней проверки"""
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.wait_stats = PoolWaitStats()
+        pool_class = type(f"{name}Pool", (TimedAsyncAdaptedQueuePool,), {"wait_stats": self.wait_stats})
+        self.engine: AsyncEngine = create_async_engine(
+            get_async_database_url(url),
+            echo=settings.database_echo,
+            **_engine_options(url, pool_class, is_async=True)
+        )
+        instrument_engine(self.engine.sync_engine)
+        self.healthy = False  # до первой проверки чтение идет в основную БД
+        self.lag_seconds: Optional[float] = None
+        self.checked_at: Optional[datetime] = None
+        self.error: Optional[str] = None
+
+    def snapshot(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "lag_seconds": None if self.lag_seconds is None else round(self.lag_seconds, 3),
+            "checked_at": self.checked_at,
+            "error": self.error
+        }
+
+class ReplicaRouter:
+    """Выбор базы для чтения: реплика или основная БД.
+
+    Реплика выбирается по кругу среди доступных с отставанием не больше
+    max_lag_seconds. Пользователь, который только что записал данные
+    (платеж, профиль), читает из основной БД pin_seconds: по закреплению
+    в процессе или, в других воркерах, по свежему users.updated_at из
+    основной БД (см. engine_for_user).
+
+    Отставание измеряется по строке replication_heartbeat: основная БД
+    получает новую отметку на каждой проверке, реплика отстает, если ее
+    отметка старше последней записанной (точность - интервал проверки).
+    """
+
+    def __init__(self, urls: List[str], max_lag_seconds: float, pin_seconds: float):
+        self.replicas = [Replica(f"replica{i}", url) for i, url in enumerate(urls)]
+        self.max_lag_seconds = max_lag_seconds
+        self.pin_seconds = pin_seconds
+        self._pins = TTLCache(maxsize=100000, ttl=pin_seconds)
+        self._round_robin = itertools.count()
+
+    def pin(self, user_id: str):
+        """Чтение пользователя из основной БД после его записи"""
+        if self.replicas:
+            self._pins.set(user_id, True)
+
+    def is_pinned(self, user_id: Optional[str], updated_at: Optional[datetime] = None) -> bool:
+        if user_id is None:
+            return False
+        if self._pins.get(user_id):
+            return True
+        return updated_at is not None and (datetime.utcnow() - updated_at).total_seconds() < self.pin_seconds
+
+    async def engine_for_user(self, user_id: str, updated_at: Optional[datetime] = None) -> AsyncEngine:
+        """Движок для чтения данных пользователя.
+
+        updated_at из кэша пользователей или токена может быть старше окна
+        закрепления, а запись могла пройти в другом воркере. Поэтому, если
+        закрепления не видно, свежий updated_at читается из основной БД -
+        один запрос по первичному ключу.
+        """
+        if self.replicas and not self.is_pinned(user_id, updated_at):
+            async with async_engine.connect() as connection:
+                result = await connection.execute(select(User.updated_at).where(User.id == user_id))
+                updated_at = result.scalar_one_or_none()
+        return self.engine_for(user_id, updated_at)
+
+    def engine_for(self, user_id: Optional[str] = None, updated_at: Optional[datetime] = None) -> AsyncEngine:
+        """Движок для чтения; user_id и updated_at - для чтения своих записей"""
+        if not self.replicas:
+            return async_engine
+        if self.is_pinned(user_id, updated_at):
+            READ_SESSIONS.inc(("primary", "pinned"))
+            return async_engine
+        available = [
+            replica for replica in self.replicas
+            if replica.healthy and replica.lag_seconds is not None and replica.lag_seconds <= self.max_lag_seconds
+        ]
+        if not available:
+            READ_SESSIONS.inc(("primary", "replicas_unavailable"))
+            return async_engine
+        replica = available[next(self._round_robin) % len(available)]
+        READ_SESSIONS.inc((replica.name, "replica"))
+        return replica.engine
+
+    async def check(self):
+        """Отставание и доступность реплик, затем новая отметка в основной БД"""
+        statement = select(ReplicationHeartbeat.written_at).where(ReplicationHeartbeat.id == 1)
+        async with async_engine.connect() as conn:
+            primary_mark = (await conn.execute(statement)).scalar_one_or_none()
+
+        for replica in self.replicas:
+            try:
+                async with replica.engine.connect() as conn:
+                    replica_mark = (await conn.execute(statement)).scalar_one_or_none()
+            except Exception as e:
+                error = str(e).splitlines()[0] if str(e) else type(e).__name__
+                if replica.healthy or replica.error is None:
+                    logger.warning(f"Read replica {replica.name} is unavailable: {error}")
+                replica.healthy = False
+                replica.error = error
+            else:
+                now = datetime.utcnow()
+                if primary_mark is None or (replica_mark is not None and replica_mark >= primary_mark):
+                    replica.lag_seconds = 0.0
+                elif replica_mark is None:
+                    replica.lag_seconds = float("inf")
+                else:
+                    # Последнюю отметку реплика еще не получила: отстает не меньше, чем на ее возраст
+                    replica.lag_seconds = (now - replica_mark).total_seconds()
+                replica.healthy = True
+                replica.error = None
+            replica.checked_at = datetime.utcnow()
+
+        await _write_heartbeat()
+
+    def snapshot(self) -> dict:
+        return {
+            "max_lag_seconds": self.max_lag_seconds,
+            "pin_seconds": self.pin_seconds,
+            "pinned_users": len(self._pins),
+            "replicas": {replica.name: replica.snapshot() for replica in self.replicas}
+        }
+
+    async def close(self):
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+async def _write_heartbeat():
+    now = datetime.utcnow()
+    try:
+        async with async_engine.begin() as conn:
+            result = await conn.execute(
+                update(ReplicationHeartbeat).where(ReplicationHeartbeat.id == 1).values(written_at=now)
+            )
+            if result.rowcount == 0:
+                await conn.execute(insert(ReplicationHeartbeat).values(id=1, written_at=now))
+    except IntegrityError:
+        # Первую отметку одновременно вставил другой воркер
+        pass
+
+async def run_replica_monitor(interval_seconds: float):
+    """Периодическая проверка реплик"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await replica_router.check()
+        except Exception as e:
+            # Основная БД недоступна: отставание реплик неизвестно
+            for replica in replica_router.replicas:
+                replica.healthy = False
+            logger.error(f"Error checking read replicas: {e}")
+
+replica_router = ReplicaRouter(
+    settings.database_replica_urls,
+    max_lag_seconds=settings.database_replica_max_lag_seconds,
+    pin_seconds=settings.database_replica_pin_seconds
+)
+
+def _pool_status(pool, wait_stats: PoolWaitStats) -> dict:
+    """Снимок состояния пула соединений"""
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+            "timeout_seconds": pool.timeout()
+        })
+    status["wait"] = wait_stats.snapshot()
+    return status
+
+def get_pool_status() -> dict:
+    """Метрики пулов синхронного и асинхронного движков и реплик"""
+    status = {
+        "async": _pool_status(async_engine.pool, async_pool_wait_stats),
+        "sync": _pool_status(engine.pool, sync_pool_wait_stats)
+    }
+    for replica in replica_router.replicas:
+        status[replica.name] = _pool_status(replica.engine.pool, replica.wait_stats)
+    return status
+
+def _pool_metrics() -> dict:
+    values = {}
+    for name, status in get_pool_status().items():
+        for state in ("checked_out", "idle", "overflow"):
+            if state in status:
+                values[(name, state)] = status[state]
+    return values
+
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Connections in the pool by engine and state", ("engine", "state"), collect=_pool_metrics
+)
+DB_POOL_WAIT = Gauge(
+    "db_pool_wait_seconds_total", "Total time spent waiting for a pool connection", ("engine",),
+    collect=lambda: {
+        (name,): status["wait"]["total_seconds"] for name, status in get_pool_status().items()
+    }
+)
+REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds", "Read replica lag behind the primary (-1 - unavailable)", ("replica",),
+    collect=lambda: {
+        (replica.name,): replica.lag_seconds if replica.healthy and replica.lag_seconds is not None else -1
+        for replica in replica_router.replicas
+    }
+)
 
 def get_session():
     """Получение сессии базы данных"""
     with Session(engine) as session:
-        yield session 
\ No newline at end of file
+        yield session
+
+async def get_async_session():
+    """Получение асинхронной сессии базы данных"""
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+def read_session() -> AsyncSession:
+    """Сессия только для чтения, не привязанного к пользователю: реплика или основная БД"""
+    return AsyncSession(replica_router.engine_for(), expire_on_commit=False)
+
+@asynccontextmanager
+async def user_read_session(user_id: str, updated_at: Optional[datetime] = None) -> AsyncIterator[AsyncSession]:
+    """Сессия для чтения данных пользователя с учетом его недавних записей во всех воркерах"""
+    engine = await replica_router.engine_for_user(user_id, updated_at)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
+
+async def get_async_read_session():
+    """Сессия для чтения, не привязанного к пользователю"""
+    async with read_session() as session:
+        yield session
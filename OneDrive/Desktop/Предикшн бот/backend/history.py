@@ -0,0 +1,55 @@
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import and_, or_
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .database import user_read_session
+from .models import Prediction, PredictionPublic
+from .serialization import dump_public
+
+# Сколько строк за раз забирается из серверного курсора при выгрузке
+STREAM_BATCH_SIZE = 500
+
+def history_query(
+    user_id: str,
+    after_created_at: Optional[datetime] = None,
+    after_id: Optional[str] = None
+):
+    """Запрос истории пользователя: от новых к старым, с продолжением после курсора"""
+    statement = select(Prediction).where(Prediction.user_id == user_id)
+    if after_created_at is not None and after_id is not None:
+        statement = statement.where(
+            or_(
+                Prediction.created_at < after_created_at,
+                and_(Prediction.created_at == after_created_at, Prediction.id < after_id)
+            )
+        )
+    return statement.order_by(Prediction.created_at.desc(), Prediction.id.desc())
+
+async def get_history_page(
+    user_id: str,
+    session: AsyncSession,
+    limit: int,
+    after_created_at: Optional[datetime] = None,
+    after_id: Optional[str] = None
+):
+    """Страница истории предсказаний по курсору (created_at, id)"""
+    result = await session.exec(
+        history_query(user_id, after_created_at, after_id).limit(limit)
+    )
+    return result.all()
+
+async def stream_history_ndjson(user_id: str, updated_at: Optional[datetime] = None) -> AsyncIterator[bytes]:
+    """Вся история пользователя в NDJSON, построчно из серверного курсора.
+
+    Сессия открывается внутри генератора: ответ отдается уже после
+    выхода из зависимостей запроса. Читается реплика, если пользователь
+    ничего не записывал недавно (updated_at).
+    """
+    statement = history_query(user_id).execution_options(yield_per=STREAM_BATCH_SIZE)
+    async with user_read_session(user_id, updated_at) as session:
+        result = await session.stream(statement)
+        async for prediction in result.scalars():
+            yield dump_public(PredictionPublic, prediction) + b"\n"
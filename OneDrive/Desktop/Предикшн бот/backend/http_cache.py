@@ -0,0 +1,75 @@
+"""Условные GET-запросы: ETag, If-None-Match и Cache-Control"""
+import hashlib
+import json
+import uuid
+from typing import Any, Optional
+
+from fastapi import Request, Response, status
+
+# Метка процесса для ETag по версии: версии в памяти у каждого воркера свои,
+# поэтому одинаковый номер версии в разных воркерах не должен совпасть по ETag
+PROCESS_TAG = uuid.uuid4().hex[:8]
+
+# Публичные данные, которые почти не меняются
+STATIC_CACHE_CONTROL = "public, max-age=86400"
+# Публичные данные, которые меняются: кэшировать, но каждый раз сверять ETag
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+# Данные пользователя: только в кэше клиента, со сверкой ETag
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+def etag_for_bytes(body: bytes) -> str:
+    """Сильный ETag по содержимому ответа"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_for_version(*parts: Any) -> str:
+    """Сильный ETag по версии данных, без сериализации ответа"""
+    return '"' + ".".join([PROCESS_TAG, *map(str, parts)]) + '"'
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Совпадает ли ETag с одним из переданных в If-None-Match"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Для If-None-Match сравнение слабое: W/ не учитывается
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+def cached_response(
+    request: Request,
+    body: bytes,
+    cache_control: str,
+    etag: Optional[str] = None,
+    media_type: str = "application/json"
+) -> Response:
+    """Ответ с ETag и Cache-Control или 304, если у клиента актуальная копия.
+
+    Заголовки из request.state.response_headers (например, новый токен
+    от get_current_user) добавляются к ответу.
+    """
+    etag = etag or etag_for_bytes(body)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    headers.update(getattr(request.state, "response_headers", {}))
+    if cache_control.startswith("private"):
+        headers["Vary"] = "Authorization"
+    if is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def not_modified_response(request: Request, etag: str, cache_control: str) -> Optional[Response]:
+    """304 до построения ответа, если ETag известен заранее"""
+    if not is_not_modified(request, etag):
+        return None
+    return cached_response(request, b"", cache_control, etag)
+
+class StaticJSON:
+    """Неизменяемый JSON-ответ, сериализованный один раз при старте"""
+
+    def __init__(self, data: Any, cache_control: str = STATIC_CACHE_CONTROL):
+        self.body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+        self.etag = etag_for_bytes(self.body)
+        self.cache_control = cache_control
+
+    def response(self, request: Request) -> Response:
+        return cached_response(request, self.body, self.cache_control, self.etag)
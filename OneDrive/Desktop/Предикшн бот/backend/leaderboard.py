@@ -0,0 +1,255 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .database import async_engine
+from .models import User, UserPublic
+
+logger = logging.getLogger(__name__)
+
+# Ключ сортировки: больше предсказаний — выше, при равенстве — по id
+LeaderboardKey = Tuple[int, str]
+
+def _key(predictions_count: int, user_id: str) -> LeaderboardKey:
+    return (-predictions_count, user_id)
+
+class CountIndex:
+    """Дерево Фенвика над корзинами predictions_count.
+
+    Хранит число пользователей с каждым значением счётчика и отвечает на
+    вопрос «сколько пользователей набрали не больше k» за O(log k).
+    При выходе счётчика за границу ёмкость удваивается.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._tree = [0] * (capacity + 1)
+        self.total = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._tree) - 1
+
+    def _grow(self, count: int):
+        capacity = self.capacity
+        while capacity <= count:
+            capacity *= 2
+        buckets = [self.count_at(k) for k in range(self.capacity)]
+        self._tree = [0] * (capacity + 1)
+        self.total = 0
+        for k, users in enumerate(buckets):
+            if users:
+                self.add(k, users)
+
+    def add(self, count: int, delta: int = 1):
+        """Изменение числа пользователей со счётчиком count на delta"""
+        if count >= self.capacity:
+            self._grow(count)
+        self.total += delta
+        i = count + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def count_le(self, count: int) -> int:
+        """Число пользователей со счётчиком не больше count"""
+        i = min(count, self.capacity - 1) + 1
+        result = 0
+        while i > 0:
+            result += self._tree[i]
+            i -= i & -i
+        return result
+
+    def count_at(self, count: int) -> int:
+        """Число пользователей ровно с count предсказаниями"""
+        return self.count_le(count) - (self.count_le(count - 1) if count > 0 else 0)
+
+class Leaderboard:
+    """Рейтинг пользователей в памяти процесса.
+
+    Строится из таблицы users при старте и обновляется на месте при
+    изменениях пользователей, поэтому чтение рейтинга не обращается к БД.
+    Вставка, удаление и поиск позиции — O(log n).
+
+    Для каждого пользователя хранится время последнего изменения
+    (updated_at, для ни разу не менявшихся - created_at): строки из БД
+    не старше него не применяются, поэтому запоздавшая синхронизация
+    не откатывает более свежие данные.
+    """
+
+    def __init__(self):
+        self._entries: SortedList = SortedList()
+        self._users: Dict[str, UserPublic] = {}
+        self._changed_at: Dict[str, Optional[datetime]] = {}
+        self._counts = CountIndex()
+        self.version = 0
+        # Наибольший updated_at среди прочитанных из БД строк
+        self.synced_until: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._users
+
+    def load(self, users: Iterable[User]):
+        """Полная пересборка рейтинга; users - объекты или строки с полями UserPublic и updated_at"""
+        users = list(users)
+        snapshots = {user.id: UserPublic.model_validate(user) for user in users}
+        self._changed_at = {user.id: _changed_at(user) for user in users}
+        self.synced_until = max(
+            (user.updated_at for user in users if user.updated_at is not None),
+            default=self.synced_until
+        )
+        if snapshots == self._users:
+            # Данные не изменились: версия остается прежней, ETag рейтинга тоже
+            return
+        self._users = snapshots
+        self._entries = SortedList(
+            _key(user.predictions_count, user.id) for user in snapshots.values()
+        )
+        self._counts = CountIndex()
+        for user in snapshots.values():
+            self._counts.add(user.predictions_count)
+        self.version += 1
+
+    def upsert(self, user: User):
+        """Добавление пользователя или обновление его данных"""
+        previous = self._users.get(user.id)
+        if previous is not None:
+            self._entries.remove(_key(previous.predictions_count, previous.id))
+            self._counts.add(previous.predictions_count, -1)
+        snapshot = UserPublic.model_validate(user)
+        self._users[user.id] = snapshot
+        self._entries.add(_key(snapshot.predictions_count, snapshot.id))
+        self._counts.add(snapshot.predictions_count)
+        self._changed_at[user.id] = _changed_at(user)
+        self.version += 1
+
+    def apply(self, users: Iterable[User]) -> int:
+        """Применение изменений из БД: только строки новее данных в памяти.
+
+        Возвращает число примененных строк.
+        """
+        applied = 0
+        for user in users:
+            if user.updated_at is not None and (self.synced_until is None or user.updated_at > self.synced_until):
+                self.synced_until = user.updated_at
+            held = self._changed_at.get(user.id)
+            if user.id in self._users and held is not None and _changed_at(user) <= held:
+                continue
+            self.upsert(user)
+            applied += 1
+        return applied
+
+    def remove(self, user_id: str):
+        """Удаление пользователя из рейтинга"""
+        previous = self._users.pop(user_id, None)
+        if previous is not None:
+            self._entries.remove(_key(previous.predictions_count, previous.id))
+            self._counts.add(previous.predictions_count, -1)
+            self._changed_at.pop(user_id, None)
+            self.version += 1
+
+    def get(self, user_id: str) -> Optional[UserPublic]:
+        return self._users.get(user_id)
+
+    def top(self, limit: int) -> List[UserPublic]:
+        """Первые limit пользователей рейтинга"""
+        return self.page(limit)
+
+    def page(
+        self,
+        limit: int,
+        after_count: Optional[int] = None,
+        after_id: Optional[str] = None
+    ) -> List[UserPublic]:
+        """Страница рейтинга после ключа (after_count, after_id)"""
+        if after_count is None or after_id is None:
+            start = 0
+        else:
+            start = self._entries.bisect_right(_key(after_count, after_id))
+        keys = self._entries.islice(start, start + max(limit, 0))
+        return [self._users[user_id] for _, user_id in keys]
+
+    def rank_of(self, user_id: str, neighbours: int = 1) -> Optional[dict]:
+        """Место пользователя, перцентиль и соседи по рейтингу.
+
+        Место общее для пользователей с равным счётчиком (1 + число
+        пользователей с большим счётчиком). Перцентиль — доля
+        пользователей, набравших не больше предсказаний.
+        """
+        user = self._users.get(user_id)
+        if user is None:
+            return None
+
+        total = self._counts.total
+        count = user.predictions_count
+        position = self._entries.index(_key(count, user_id))
+        above = self._entries.islice(max(position - neighbours, 0), position)
+        below = self._entries.islice(position + 1, position + 1 + neighbours)
+
+        return {
+            "rank": total - self._counts.count_le(count) + 1,
+            "total_users": total,
+            "percentile": round(100 * self._counts.count_le(count) / total, 2),
+            "predictions_count": count,
+            "above": [self._users[other_id] for _, other_id in above],
+            "below": [self._users[other_id] for _, other_id in below]
+        }
+
+def _changed_at(user) -> Optional[datetime]:
+    return getattr(user, "updated_at", None) or getattr(user, "created_at", None)
+
+# Колонки снимка рейтинга: строки без ORM-объектов загружаются в разы быстрее
+LEADERBOARD_COLUMNS = [getattr(User, name) for name in UserPublic.model_fields] + [User.updated_at]
+
+# Запас при выборке изменений: updated_at ставится до коммита, и строка
+# может стать видна позже строк с большим updated_at
+RESYNC_OVERLAP = timedelta(seconds=60)
+
+async def rebuild_leaderboard():
+    """Полная загрузка рейтинга из основной БД (при старте воркера)"""
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        result = await session.exec(select(*LEADERBOARD_COLUMNS))
+        leaderboard.load(result.all())
+
+async def sync_leaderboard() -> int:
+    """Подтягивание изменений пользователей с отметки прошлой синхронизации.
+
+    Читает основную БД (реплика может отставать) по индексу
+    ix_users_updated_at: только строки, измененные за интервал
+    синхронизации плюс RESYNC_OVERLAP, а не всю таблицу users.
+    """
+    if leaderboard.synced_until is None:
+        # В БД еще нет измененных пользователей - отметки нет
+        since = datetime.min
+    else:
+        since = leaderboard.synced_until - RESYNC_OVERLAP
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        result = await session.exec(
+            select(*LEADERBOARD_COLUMNS).where(User.updated_at > since)
+        )
+        return leaderboard.apply(result.all())
+
+async def run_leaderboard_resync(interval_seconds: int):
+    """Периодическая синхронизация рейтинга.
+
+    Каждый воркер держит свою копию рейтинга; синхронизация подтягивает
+    изменения, сделанные другими воркерами и ботом. Полный просмотр users
+    (O(n) строк на воркер) выполняется только при старте, дальше - выборка
+    по диапазону updated_at, пропорциональная числу изменений.
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await sync_leaderboard()
+        except Exception as e:
+            logger.error(f"Error syncing leaderboard: {e}")
+
+# Глобальный рейтинг процесса
+leaderboard = Leaderboard()
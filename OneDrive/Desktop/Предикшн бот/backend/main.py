@@ -1,39 +1,136 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+# Первым импортом: от него отсчитывается время импорта приложения
+from .startup import startup_stats, run_deferred_imports
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer
-from sqlmodel import Session, create_engine, SQLModel
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from contextlib import asynccontextmanager
+import asyncio
+import logging
+import random
 from typing import List, Optional
-import os
-from datetime import datetime, timedelta
+from datetime import date, datetime
 import uuid
 
 from .models import (
     User, UserCreate, UserPublic, UserUpdate,
-    Prediction, PredictionCreate, PredictionPublic,
-    Payment, PaymentCreate, PaymentPublic,
-    ZodiacSign
+    PredictionPublic,
+    Payment, PaymentPublic,
+    ZodiacSign, UserRank, TelegramPaymentConfirmation,
+    UserStats, GlobalStats, BroadcastRecipient
+)
+from .database import (
+    get_async_session, get_async_read_session, replica_router, run_replica_monitor
+)
+from .auth import (
+    get_current_user, get_current_user_for_update, get_user_read_session,
+    invalidate_user_cache, reissue_user_token, verify_internal_token, ACCESS_TOKEN_HEADER
+)
+from .migrate import verify_schema_version
+from .predictions import run_daily_tables_prewarm
+from .leaderboard import leaderboard, rebuild_leaderboard, run_leaderboard_resync
+from .history import get_history_page, stream_history_ndjson
+from .broadcast import get_broadcast_recipients, get_broadcast_texts
+from .stats import record_user_created, get_user_stats, get_global_stats
+from .payments import (
+    find_today_prediction, seconds_until_next_prediction,
+    create_pending_payment, complete_payment
+)
+from .http_cache import (
+    StaticJSON, cached_response, etag_for_version, not_modified_response,
+    REVALIDATE_CACHE_CONTROL, PRIVATE_CACHE_CONTROL
 )
-from .database import get_session, create_db_and_tables
-from .auth import get_current_user
-from .predictions import generate_prediction_for_sign
+from .serialization import dump_public, public_response
+from .rate_limit import RateLimitMiddleware, create_rate_limit_backend
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, render_metrics
+from .cache import TTLCache
 from .config import settings
 
+logger = logging.getLogger(__name__)
+
 security = HTTPBearer()
 
+# Сериализованные страницы рейтинга по ETag (ETag включает версию рейтинга)
+rankings_bodies = TTLCache(maxsize=64, ttl=300)
+
+# Хранилище bucket'ов ограничения частоты запросов
+rate_limit_backend = create_rate_limit_backend() if settings.rate_limit_enabled else None
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Создаем таблицы при запуске
-    create_db_and_tables()
+    # Схему меняет python -m backend.migrate; воркер только сверяет ее версию
+    with startup_stats.phase("schema_version"):
+        verify_schema_version()
+    
+    # Реплики чтения: первая проверка до приема запросов, затем периодически
+    replica_monitor_task = None
+    if replica_router.replicas:
+        with startup_stats.phase("replicas"):
+            await replica_router.check()
+        replica_monitor_task = asyncio.create_task(
+            run_replica_monitor(settings.database_replica_check_interval_seconds)
+        )
+    
+    # Загружаем рейтинг в память
+    with startup_stats.phase("leaderboard"):
+        await rebuild_leaderboard()
+    resync_task = None
+    if settings.leaderboard_resync_seconds > 0:
+        resync_task = asyncio.create_task(
+            run_leaderboard_resync(settings.leaderboard_resync_seconds)
+        )
+    
+    # Прогреваем таблицы предсказаний на ближайшие дни
+    prewarm_task = asyncio.create_task(
+        run_daily_tables_prewarm(settings.prediction_prewarm_days)
+    )
+    
+    # Истечение зависших инвойсов и сверка списаний. Первый проход - через
+    # случайную долю интервала: воркеры, поднятые разом, не начинают с него
+    payment_worker_task = None
+    if settings.payment_worker_interval_seconds > 0:
+        from .payment_worker import run_payment_worker
+        payment_worker_task = asyncio.create_task(
+            run_payment_worker(
+                settings.payment_worker_interval_seconds,
+                initial_delay=random.uniform(0, settings.payment_worker_interval_seconds)
+            )
+        )
+    
+    # Модули, не нужные для первых запросов, загружаются уже после старта
+    deferred_imports_task = asyncio.create_task(run_deferred_imports())
+    startup_stats.ready()
+    logger.info(f"Startup: {startup_stats.format()}")
+    
     yield
+    
+    deferred_imports_task.cancel()
+    prewarm_task.cancel()
+    if payment_worker_task:
+        payment_worker_task.cancel()
+    if resync_task:
+        resync_task.cancel()
+    if rate_limit_backend:
+        await rate_limit_backend.close()
+    if replica_monitor_task:
+        replica_monitor_task.cancel()
+    await replica_router.close()
 
 app = FastAPI(
     title="🔮 Prediction Bot API",
     description="API для веб-приложения ежедневных предсказаний",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
+# Ограничение частоты запросов; CORS подключается после, чтобы 429 тоже получал CORS-заголовки
+if rate_limit_backend:
+    app.add_middleware(RateLimitMiddleware, backend=rate_limit_backend)
+
 # CORS настройки
 app.add_middleware(
     CORSMiddleware,
@@ -41,22 +138,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", ACCESS_TOKEN_HEADER],
 )
 
+# Метрики снаружи остальных middleware: учитываются и ответы 429
+if settings.query_profiler_enabled:
+    from .query_profiler import query_profiler
+    app.add_middleware(MetricsMiddleware, profiler=query_profiler)
+else:
+    app.add_middleware(MetricsMiddleware)
+
+# Служебные эндпоинты (пулы, реплики, профилировщик SQL, воркер платежей, запуск)
+if settings.admin_routes_enabled:
+    from .admin import router as admin_router
+    app.include_router(admin_router)
+
 @app.get("/")
 async def root():
     """Главная страница API"""
     return {"message": "🔮 Prediction Bot API", "status": "active"}
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Метрики процесса в формате Prometheus"""
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 # === ПОЛЬЗОВАТЕЛИ ===
 @app.post("/users/", response_model=UserPublic)
 async def create_user(
     user: UserCreate,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Создание нового пользователя"""
     # Проверяем, существует ли пользователь
-    existing_user = session.query(User).filter(User.telegram_id == user.telegram_id).first()
+    result = await session.exec(select(User).where(User.telegram_id == user.telegram_id))
+    existing_user = result.first()
     if existing_user:
         raise HTTPException(
             status_code=400,
@@ -66,25 +182,31 @@ async def create_user(
     db_user = User.model_validate(user)
     db_user.id = str(uuid.uuid4())
     db_user.created_at = datetime.utcnow()
+    # По updated_at другие воркеры подхватывают нового пользователя в рейтинг
+    db_user.updated_at = db_user.created_at
     
     session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
+    await record_user_created(session)
+    await session.commit()
+    leaderboard.upsert(db_user)
     
     return db_user
 
 @app.get("/users/me", response_model=UserPublic)
 async def get_current_user_profile(
+    request: Request,
     current_user: User = Depends(get_current_user)
 ):
     """Получение профиля текущего пользователя"""
-    return current_user
+    body = dump_public(UserPublic, current_user)
+    return cached_response(request, body, PRIVATE_CACHE_CONTROL)
 
 @app.patch("/users/me", response_model=UserPublic)
 async def update_user_profile(
     user_update: UserUpdate,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    response: Response,
+    current_user: User = Depends(get_current_user_for_update),
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Обновление профиля пользователя"""
     for field, value in user_update.model_dump(exclude_unset=True).items():
@@ -92,71 +214,109 @@ async def update_user_profile(
     
     current_user.updated_at = datetime.utcnow()
     session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
+    await session.commit()
+    replica_router.pin(current_user.id)
+    invalidate_user_cache(current_user.id)
+    leaderboard.upsert(current_user)
+    reissue_user_token(response, current_user)
     
     return current_user
 
+@app.get("/users/me/rank", response_model=UserRank)
+async def get_current_user_rank(
+    neighbours: int = Query(default=1, ge=0, le=10),
+    current_user: User = Depends(get_current_user)
+):
+    """Место текущего пользователя в рейтинге"""
+    if current_user.id not in leaderboard:
+        leaderboard.upsert(current_user)
+    
+    return leaderboard.rank_of(current_user.id, neighbours)
+
+@app.get("/users/me/stats", response_model=UserStats)
+async def get_current_user_stats(
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_user_read_session)
+):
+    """Статистика текущего пользователя: серии и потраченные Stars"""
+    return await get_user_stats(current_user.id, session)
+
 @app.get("/users/rankings", response_model=List[UserPublic])
 async def get_user_rankings(
-    limit: int = 100,
-    session: Session = Depends(get_session)
+    request: Request,
+    limit: int = Query(default=100, ge=1, le=1000),
+    after_count: Optional[int] = None,
+    after_id: Optional[str] = None
 ):
-    """Получение рейтинга пользователей по количеству покупок"""
-    users = session.query(User).order_by(User.predictions_count.desc()).limit(limit).all()
-    return users
+    """Получение рейтинга пользователей по количеству покупок.
+    
+    Для следующей страницы передайте predictions_count и id последнего
+    пользователя предыдущей страницы в after_count и after_id.
+    ETag меняется вместе с версией рейтинга.
+    """
+    etag = etag_for_version("rankings", leaderboard.version, limit, after_count, after_id)
+    not_modified = not_modified_response(request, etag, REVALIDATE_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    
+    body = rankings_bodies.get(etag)
+    if body is None:
+        body = dump_public(UserPublic, leaderboard.page(limit, after_count, after_id))
+        rankings_bodies.set(etag, body)
+    return cached_response(request, body, REVALIDATE_CACHE_CONTROL, etag)
 
 # === ПРЕДСКАЗАНИЯ ===
 @app.get("/predictions/", response_model=List[PredictionPublic])
 async def get_user_predictions(
+    limit: int = Query(default=50, ge=1, le=200),
+    after_created_at: Optional[datetime] = None,
+    after_id: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_user_read_session)
 ):
-    """Получение всех предсказаний пользователя"""
-    predictions = session.query(Prediction).filter(
-        Prediction.user_id == current_user.id
-    ).order_by(Prediction.created_at.desc()).all()
+    """Получение предсказаний пользователя, от новых к старым.
     
-    return predictions
+    Для следующей страницы передайте created_at и id последнего
+    предсказания предыдущей страницы в after_created_at и after_id.
+    """
+    predictions = await get_history_page(
+        current_user.id, session, limit, after_created_at, after_id
+    )
+    return public_response(PredictionPublic, predictions)
+
+@app.get("/predictions/export")
+async def export_user_predictions(current_user: User = Depends(get_current_user)):
+    """Вся история предсказаний пользователя потоком в формате NDJSON"""
+    return StreamingResponse(
+        stream_history_ndjson(current_user.id, current_user.updated_at),
+        media_type="application/x-ndjson"
+    )
 
 @app.get("/predictions/today", response_model=Optional[PredictionPublic])
 async def get_today_prediction(
+    request: Request,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_user_read_session)
 ):
     """Получение предсказания на сегодня"""
-    today = datetime.utcnow().date()
-    
-    prediction = session.query(Prediction).filter(
-        Prediction.user_id == current_user.id,
-        Prediction.prediction_date == today
-    ).first()
-    
-    return prediction
+    prediction = await find_today_prediction(current_user.id, session)
+    body = dump_public(PredictionPublic, prediction)
+    return cached_response(request, body, PRIVATE_CACHE_CONTROL)
 
 @app.get("/predictions/can-purchase")
 async def can_purchase_prediction(
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_user_read_session)
 ):
     """Проверка, может ли пользователь купить предсказание"""
-    today = datetime.utcnow().date()
-    
     # Проверяем, есть ли уже предсказание на сегодня
-    existing_prediction = session.query(Prediction).filter(
-        Prediction.user_id == current_user.id,
-        Prediction.prediction_date == today
-    ).first()
+    existing_prediction = await find_today_prediction(current_user.id, session)
     
     if existing_prediction:
-        # Вычисляем время до следующего дня
-        tomorrow = datetime.combine(today + timedelta(days=1), datetime.min.time())
-        time_until_tomorrow = tomorrow - datetime.utcnow()
-        
         return {
             "can_purchase": False,
             "reason": "already_purchased_today",
-            "next_available_in_seconds": int(time_until_tomorrow.total_seconds())
+            "next_available_in_seconds": seconds_until_next_prediction()
         }
     
     return {"can_purchase": True}
@@ -165,7 +325,7 @@ async def can_purchase_prediction(
 @app.post("/payments/create-invoice")
 async def create_payment_invoice(
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Создание инвойса для оплаты предсказания в XTR Stars"""
     # Проверяем, может ли пользователь купить предсказание
@@ -176,19 +336,7 @@ async def create_payment_invoice(
             detail="Нельзя купить предсказание: " + can_purchase["reason"]
         )
     
-    # Создаем запись о платеже для XTR Stars
-    payment = Payment(
-        id=str(uuid.uuid4()),
-        user_id=current_user.id,
-        amount=1,  # 1 XTR Star (минимальная единица платежа)
-        currency="XTR",  # Telegram Stars
-        status="pending",
-        created_at=datetime.utcnow()
-    )
-    
-    session.add(payment)
-    session.commit()
-    session.refresh(payment)
+    payment = await create_pending_payment(current_user, session)
     
     # Для XTR Stars не нужен provider_token - инвойс отправляется ботом
     # Telegram Bot создаст invoice с помощью send_invoice()
@@ -202,74 +350,143 @@ async def create_payment_invoice(
 @app.post("/payments/{payment_id}/confirm")
 async def confirm_payment(
     payment_id: str,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Подтверждение платежа и создание предсказания"""
-    # Получаем платеж
-    payment = session.query(Payment).filter(
-        Payment.id == payment_id,
-        Payment.user_id == current_user.id
-    ).first()
-    
-    if not payment:
-        raise HTTPException(status_code=404, detail="Платеж не найден")
+    prediction = await complete_payment(payment_id, current_user, session)
+    replica_router.pin(current_user.id)
+    # complete_payment обновил счетчик и профиль current_user из БД
+    reissue_user_token(response, current_user)
     
-    if payment.status != "pending":
-        raise HTTPException(status_code=400, detail="Платеж уже обработан")
+    return {
+        "message": "Платеж подтвержден, предсказание создано",
+        "prediction": prediction
+    }
+
+# === ВНУТРЕННИЕ ЭНДПОИНТЫ ДЛЯ БОТА ===
+async def get_user_by_telegram_id(telegram_id: int, session: AsyncSession) -> User:
+    """Пользователь по Telegram ID или 404"""
+    result = await session.exec(select(User).where(User.telegram_id == telegram_id))
+    user = result.first()
+    if user is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    return user
+
+@app.post("/internal/telegram/{telegram_id}/purchase", dependencies=[Depends(verify_internal_token)])
+async def telegram_start_purchase(
+    telegram_id: int,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Проверка лимита, профиля и создание инвойса за один запрос бота"""
+    user = await get_user_by_telegram_id(telegram_id, session)
+    response = {"user": UserPublic.model_validate(user)}
     
-    # Обновляем статус платежа
-    payment.status = "completed"
-    payment.updated_at = datetime.utcnow()
+    if await find_today_prediction(user.id, session):
+        response.update({
+            "status": "already_purchased_today",
+            "next_available_in_seconds": seconds_until_next_prediction()
+        })
+        return response
     
-    # Создаем предсказание
-    today = datetime.utcnow().date()
-    prediction_text = generate_prediction_for_sign(current_user.zodiac_sign)
+    if not user.zodiac_sign:
+        response["status"] = "zodiac_sign_required"
+        return response
     
-    prediction = Prediction(
-        id=str(uuid.uuid4()),
-        user_id=current_user.id,
-        zodiac_sign=current_user.zodiac_sign,
-        prediction_text=prediction_text,
-        prediction_date=today,
-        created_at=datetime.utcnow()
+    payment = await create_pending_payment(user, session)
+    response.update({
+        "status": "invoice_created",
+        "payment": {
+            "payment_id": payment.id,
+            "amount": payment.amount,
+            "currency": payment.currency,
+            "status": payment.status
+        }
+    })
+    return response
+
+@app.get("/internal/telegram/{telegram_id}/payments/{payment_id}", dependencies=[Depends(verify_internal_token)])
+async def telegram_get_payment(
+    telegram_id: int,
+    payment_id: str,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Проверка платежа перед списанием (pre_checkout_query)"""
+    user = await get_user_by_telegram_id(telegram_id, session)
+    payment = await session.get(Payment, payment_id)
+    if payment is None or payment.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Платеж не найден")
+    return PaymentPublic.model_validate(payment)
+
+@app.post("/internal/telegram/{telegram_id}/payments/{payment_id}/confirm", dependencies=[Depends(verify_internal_token)])
+async def telegram_confirm_payment(
+    telegram_id: int,
+    payment_id: str,
+    confirmation: TelegramPaymentConfirmation,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Подтверждение платежа из бота, в ответе - готовое предсказание"""
+    user = await get_user_by_telegram_id(telegram_id, session)
+    prediction = await complete_payment(
+        payment_id, user, session,
+        telegram_payment_id=confirmation.telegram_payment_charge_id
     )
-    
-    # Увеличиваем счетчик предсказаний пользователя
-    current_user.predictions_count += 1
-    current_user.updated_at = datetime.utcnow()
-    
-    session.add(payment)
-    session.add(prediction)
-    session.add(current_user)
-    session.commit()
-    
-    session.refresh(prediction)
+    replica_router.pin(user.id)
     
     return {
         "message": "Платеж подтвержден, предсказание создано",
         "prediction": prediction
     }
 
+@app.get(
+    "/internal/broadcast/recipients",
+    response_model=List[BroadcastRecipient],
+    dependencies=[Depends(verify_internal_token)]
+)
+async def broadcast_recipients(
+    limit: int = Query(default=500, ge=1, le=5000),
+    after_sign: Optional[ZodiacSign] = None,
+    after_id: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_read_session)
+):
+    """Подписчики ежедневной рассылки, постранично по (zodiac_sign, id)"""
+    return await get_broadcast_recipients(session, limit, after_sign, after_id)
+
+@app.get("/internal/broadcast/texts", dependencies=[Depends(verify_internal_token)])
+async def broadcast_texts(day: Optional[date] = None):
+    """Тексты рассылки по знакам на дату (по умолчанию - сегодня по UTC)"""
+    return get_broadcast_texts(day or datetime.utcnow().date())
+
+# === СТАТИСТИКА ===
+@app.get("/stats", response_model=GlobalStats)
+async def get_service_stats(session: AsyncSession = Depends(get_async_read_session)):
+    """Общая статистика сервиса"""
+    return await get_global_stats(session)
+
 # === ЗОДИАКАЛЬНЫЕ ЗНАКИ ===
+ZODIAC_SIGNS = [
+    {"name": "aries", "title": "Овен", "emoji": "♈"},
+    {"name": "taurus", "title": "Телец", "emoji": "♉"},
+    {"name": "gemini", "title": "Близнецы", "emoji": "♊"},
+    {"name": "cancer", "title": "Рак", "emoji": "♋"},
+    {"name": "leo", "title": "Лев", "emoji": "♌"},
+    {"name": "virgo", "title": "Дева", "emoji": "♍"},
+    {"name": "libra", "title": "Весы", "emoji": "♎"},
+    {"name": "scorpio", "title": "Скорпион", "emoji": "♏"},
+    {"name": "sagittarius", "title": "Стрелец", "emoji": "♐"},
+    {"name": "capricorn", "title": "Козерог", "emoji": "♑"},
+    {"name": "aquarius", "title": "Водолей", "emoji": "♒"},
+    {"name": "pisces", "title": "Рыбы", "emoji": "♓"}
+]
+zodiac_signs_response = StaticJSON(ZODIAC_SIGNS)
+
+startup_stats.imported()
+
 @app.get("/zodiac-signs")
-async def get_zodiac_signs():
+async def get_zodiac_signs(request: Request):
     """Получение списка всех зодиакальных знаков"""
-    signs = [
-        {"name": "aries", "title": "Овен", "emoji": "♈"},
-        {"name": "taurus", "title": "Телец", "emoji": "♉"},
-        {"name": "gemini", "title": "Близнецы", "emoji": "♊"},
-        {"name": "cancer", "title": "Рак", "emoji": "♋"},
-        {"name": "leo", "title": "Лев", "emoji": "♌"},
-        {"name": "virgo", "title": "Дева", "emoji": "♍"},
-        {"name": "libra", "title": "Весы", "emoji": "♎"},
-        {"name": "scorpio", "title": "Скорпион", "emoji": "♏"},
-        {"name": "sagittarius", "title": "Стрелец", "emoji": "♐"},
-        {"name": "capricorn", "title": "Козерог", "emoji": "♑"},
-        {"name": "aquarius", "title": "Водолей", "emoji": "♒"},
-        {"name": "pisces", "title": "Рыбы", "emoji": "♓"}
-    ]
-    return signs
+    return zodiac_signs_response.response(request)
 
 if __name__ == "__main__":
     import uvicorn
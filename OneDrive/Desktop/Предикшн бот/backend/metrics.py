@@ -0,0 +1,270 @@
+"""Метрики API в формате Prometheus: задержки маршрутов, запросы к БД, пулы.
+
+Метрики хранятся в памяти процесса и отдаются на GET /metrics. При
+нескольких воркерах uvicorn у каждого свои значения, поэтому собирать
+их нужно с каждого процесса (один воркер на контейнер).
+"""
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .startup import startup_stats
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # charset добавляет Response
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """Метрика с фиксированным набором меток"""
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        # Метрика без меток видна с нулевым значением до первого изменения
+        self.values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0}
+
+    def inc(self, labels: LabelValues = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self.values.items()
+        ]
+
+class Gauge(Metric):
+    """Значение выставляется напрямую или читается функцией collect при выдаче"""
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        collect: Optional[Callable[[], Dict[LabelValues, float]]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        # Метрика без меток видна с нулевым значением до первого изменения
+        self.values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0}
+        self.collect = collect
+
+    def inc(self, labels: LabelValues = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, labels: LabelValues = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+    def samples(self) -> List[str]:
+        values = self.collect() if self.collect else self.values
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in values.items()
+        ]
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # метки -> (счетчики по корзинам, сумма, количество)
+        self.values: Dict[LabelValues, list] = {}
+
+    def observe(self, labels: LabelValues, value: float):
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        counts = state[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+REGISTRY: List[Metric] = []
+
+def render_metrics() -> bytes:
+    """Все метрики процесса в текстовом формате Prometheus"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.header())
+        lines.extend(metric.samples())
+    return ("\n".join(lines) + "\n").encode()
+
+# === HTTP ===
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status code", ("method", "route", "status")
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response is sent", ("method", "route")
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being processed")
+
+# === ЗАПУСК ===
+STARTUP_TIME = Gauge(
+    "app_startup_seconds", "Worker startup time: application import and lifespan phases", ("phase",),
+    collect=startup_stats.metric_values
+)
+
+# === БАЗА ДАННЫХ ===
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed, by route or background", ("route",))
+DB_TIME = Counter("db_query_duration_seconds_total", "Time spent in SQL statements", ("route",))
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements per HTTP request", ("method", "route"), QUERY_COUNT_BUCKETS
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Time spent in SQL statements per HTTP request", ("method", "route")
+)
+
+@dataclass
+class RequestDBStats:
+    """Запросы к БД в рамках одного HTTP-запроса"""
+    queries: int = 0
+    seconds: float = 0.0
+    # (выражение, параметры, секунды) и отметки COMMIT - только для профилировщика
+    statements: Optional[list] = None
+
+request_db_stats: ContextVar[Optional[RequestDBStats]] = ContextVar("request_db_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = request_db_stats.get()
+    if stats is None:
+        # Фоновые задачи: рейтинг, прогрев, воркер платежей
+        DB_QUERIES.inc(("background",))
+        DB_TIME.inc(("background",), elapsed)
+        return
+    stats.queries += 1
+    stats.seconds += elapsed
+    if stats.statements is not None:
+        stats.statements.append((statement, parameters, elapsed))
+
+def _commit(conn):
+    stats = request_db_stats.get()
+    if stats is not None and stats.statements is not None:
+        stats.statements.append(("COMMIT", None, 0.0))
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+def instrument_engine(engine):
+    """Подсчет запросов и времени в БД для синхронного движка (или async_engine.sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    event.listen(engine, "commit", _commit)
+
+# === MIDDLEWARE ===
+UNMATCHED_ROUTE = "unmatched"
+
+class MetricsMiddleware:
+    """ASGI-middleware: задержка, статус и запросы к БД по шаблону маршрута.
+
+    С profiler (QueryProfiler) выражения каждого запроса сохраняются
+    и проверяются после ответа.
+    """
+
+    def __init__(self, app: ASGIApp, profiler=None):
+        self.app = app
+        self.profiler = profiler
+        self._route_paths: Optional[Dict[Callable, str]] = None
+
+    def _route_path(self, scope: Scope) -> str:
+        # Маршрутизатор кладет endpoint в общий scope; шаблон пути ограничивает число меток
+        if self._route_paths is None:
+            self._route_paths = {
+                route.endpoint: route.path
+                for route in scope["app"].router.routes if hasattr(route, "endpoint")
+            }
+        route_path = self._route_paths.get(scope.get("endpoint"))
+        # До маршрутизатора запрос не дошел (429): шаблон оставляет RateLimitMiddleware
+        return route_path or scope.get("route_path") or UNMATCHED_ROUTE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        db_stats = RequestDBStats(statements=[] if self.profiler else None)
+        token = request_db_stats.set(db_stats)
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            request_db_stats.reset(token)
+
+            method, route = scope["method"], self._route_path(scope)
+            HTTP_REQUESTS.inc((method, route, str(status_code)))
+            HTTP_LATENCY.observe((method, route), elapsed)
+            DB_QUERIES.inc((route,), db_stats.queries)
+            DB_TIME.inc((route,), db_stats.seconds)
+            DB_QUERIES_PER_REQUEST.observe((method, route), db_stats.queries)
+            DB_TIME_PER_REQUEST.observe((method, route), db_stats.seconds)
+            if self.profiler:
+                self.profiler.analyze(method, route, status_code, db_stats.statements)
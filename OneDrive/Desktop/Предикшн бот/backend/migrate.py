@@ -0,0 +1,204 @@
+"""Миграции схемы БД: применяются отдельно от воркеров, воркер только сверяет версию.
+
+Схема меняется миграциями Alembic (migrations/versions), а не create_all
+при старте каждого воркера. Перед выкладкой новой версии кода:
+    cd .. && python -m backend.migrate            # до последней версии
+    cd .. && python -m backend.migrate check      # код выхода 1, если схема отстает
+    cd .. && python -m backend.migrate current    # версия БД и кода
+
+Пустая БД создается по моделям и помечается последней версией: ранние
+миграции рассчитаны на таблицы, уже созданные приложением. При старте
+воркер вызывает verify_schema_version - один запрос к alembic_version;
+Alembic при этом не импортируется, версии кода читаются из файлов миграций.
+
+Индексы на больших таблицах (predictions, payments) миграции строят
+через create_index_concurrently: на PostgreSQL это CREATE INDEX
+CONCURRENTLY вне транзакции миграции, запись в таблицу не блокируется.
+Внешние ключи - через create_foreign_key_not_valid: ограничение добавляется
+без проверки строк, проверка идет отдельно и запись тоже не блокирует.
+"""
+import argparse
+import logging
+import re
+import sys
+from pathlib import Path
+from typing import Optional, Sequence, Set, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlmodel import SQLModel
+
+from . import models  # noqa: F401 - регистрация таблиц в метаданных
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parent
+VERSIONS_DIR = BACKEND_DIR / "migrations" / "versions"
+VERSION_TABLE = "alembic_version"
+
+_REVISION = re.compile(r"^revision\s*=\s*['\"]([\w-]+)['\"]", re.MULTILINE)
+_DOWN_REVISION = re.compile(r"^down_revision\s*=\s*(.+)$", re.MULTILINE)
+_QUOTED = re.compile(r"['\"]([\w-]+)['\"]")
+
+class SchemaVersionError(RuntimeError):
+    """Версия схемы БД не подходит к коду"""
+
+def alembic_config():
+    from alembic.config import Config
+
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    # Путь к миграциям не зависит от текущего каталога
+    config.set_main_option("script_location", str(BACKEND_DIR / "migrations"))
+    return config
+
+def get_code_revisions() -> Tuple[str, Set[str]]:
+    """Последняя версия схемы в коде и все известные коду версии (по файлам миграций)"""
+    revisions, parents = set(), set()
+    for path in VERSIONS_DIR.glob("*.py"):
+        source = path.read_text(encoding="utf-8")
+        revision = _REVISION.search(source)
+        if revision is None:
+            continue
+        revisions.add(revision.group(1))
+        down_revision = _DOWN_REVISION.search(source)
+        if down_revision:
+            parents.update(_QUOTED.findall(down_revision.group(1)))
+    heads = revisions - parents
+    if len(heads) != 1:
+        raise SchemaVersionError(f"Ожидается одна последняя миграция, найдено: {sorted(heads)}")
+    return heads.pop(), revisions
+
+def get_database_revision() -> Optional[str]:
+    """Версия схемы из alembic_version; None - схема не создана миграциями"""
+    with engine.connect() as connection:
+        try:
+            return connection.execute(text(f"SELECT version_num FROM {VERSION_TABLE}")).scalar()
+        except (OperationalError, ProgrammingError):
+            return None
+
+def verify_schema_version() -> str:
+    """Проверка при старте воркера: схема БД не старше кода"""
+    head, known = get_code_revisions()
+    current = get_database_revision()
+    if current == head:
+        return current
+    if current is None:
+        raise SchemaVersionError("Схема БД не создана: выполните python -m backend.migrate")
+    if current in known:
+        raise SchemaVersionError(
+            f"Схема БД устарела ({current}, код ожидает {head}): выполните python -m backend.migrate"
+        )
+    # Версия неизвестна коду: новая версия уже применила свои миграции (выкладка по очереди)
+    logger.warning(f"Database schema {current} is newer than code head {head}")
+    return current
+
+def create_schema():
+    """Таблицы по моделям и отметка последней версии - для пустой БД"""
+    from alembic import command
+
+    SQLModel.metadata.create_all(engine)
+    command.stamp(alembic_config(), "head")
+
+def upgrade(revision: str = "head"):
+    """Применение миграций; пустая БД создается сразу в последней версии"""
+    from alembic import command
+
+    with engine.connect() as connection:
+        tables = set(inspect(connection).get_table_names()) - {VERSION_TABLE}
+    if not tables:
+        logger.info("Empty database: creating tables from models")
+        create_schema()
+        return
+    command.upgrade(alembic_config(), revision)
+
+# === ОПЕРАЦИИ ДЛЯ МИГРАЦИЙ ===
+def create_index_concurrently(name: str, table: str, columns: Sequence[str], unique: bool = False):
+    """Индекс без блокировки записи в таблицу.
+
+    На PostgreSQL - CREATE INDEX CONCURRENTLY вне транзакции миграции;
+    невалидный индекс от прерванной попытки удаляется и строится заново.
+    Остальные СУБД строят индекс обычным образом.
+    """
+    from alembic import op
+
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        op.create_index(name, table, list(columns), unique=unique, if_not_exists=True)
+        return
+
+    with op.get_context().autocommit_block():
+        invalid = bind.execute(
+            text(
+                "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+            ),
+            {"name": name}
+        ).first()
+        if invalid:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+        op.create_index(
+            name, table, list(columns), unique=unique,
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+def drop_index_concurrently(name: str, table: str):
+    """Удаление индекса без блокировки записи в таблицу (DROP INDEX CONCURRENTLY)"""
+    from alembic import op
+
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index(name, table_name=table, if_exists=True)
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+def create_foreign_key_not_valid(
+    name: str,
+    table: str,
+    referent: str,
+    columns: Sequence[str],
+    referent_columns: Sequence[str]
+):
+    """Внешний ключ на PostgreSQL без долгой блокировки обеих таблиц.
+
+    Обычный ADD CONSTRAINT проверяет всю таблицу под SHARE ROW EXCLUSIVE
+    на обеих таблицах - запись в них стоит до конца проверки. Здесь
+    ограничение добавляется как NOT VALID (только новые строки, без
+    просмотра таблицы), а VALIDATE CONSTRAINT выполняется вне транзакции
+    миграции под SHARE UPDATE EXCLUSIVE, не мешающей записи. Повторный
+    запуск после прерванной проверки только проверяет ограничение.
+    """
+    from alembic import op
+
+    bind = op.get_bind()
+    exists = bind.execute(
+        text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {"name": name}
+    ).first()
+    if not exists:
+        op.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {name} "
+            f"FOREIGN KEY ({', '.join(columns)}) REFERENCES {referent} ({', '.join(referent_columns)}) "
+            f"NOT VALID"
+        )
+    with op.get_context().autocommit_block():
+        op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    parser.add_argument("command", nargs="?", default="upgrade", choices=("upgrade", "check", "current"))
+    parser.add_argument("--revision", default="head", help="версия для upgrade")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "upgrade":
+        upgrade(args.revision)
+        print(f"Схема БД: {get_database_revision()}")
+    elif args.command == "check":
+        try:
+            print(f"Схема БД актуальна: {verify_schema_version()}")
+        except SchemaVersionError as e:
+            print(e)
+            sys.exit(1)
+    else:
+        head, _ = get_code_revisions()
+        print(f"БД: {get_database_revision()}, код: {head}")
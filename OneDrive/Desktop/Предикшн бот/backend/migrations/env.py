@@ -0,0 +1,46 @@
+from alembic import context
+from sqlmodel import SQLModel
+
+from backend import models  # noqa: F401 - регистрация таблиц в метаданных
+from backend.database import engine
+
+target_metadata = SQLModel.metadata
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Архивные таблицы миграций (*_archive) не описаны в моделях, autogenerate их не трогает"""
+    return not (type_ == "table" and reflected and compare_to is None and name.endswith("_archive"))
+
+def run_migrations_offline():
+    """Генерация SQL без подключения к базе данных"""
+    context.configure(
+        url=str(engine.url),
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    """Применение миграций к базе данных"""
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            # statement_timeout приложения прервал бы построение индекса на большой таблице
+            connection.exec_driver_sql("SET statement_timeout = 0")
+            connection.commit()
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            render_as_batch=connection.dialect.name == "sqlite",
+            # Каждая миграция в своей транзакции: CONCURRENTLY-индексы выполняются между ними
+            transaction_per_migration=True,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,67 @@
+"""Уникальный индекс (user_id, prediction_date) для предсказаний
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-06-19
+"""
+import logging
+
+from alembic import context, op
+from sqlalchemy import text
+
+from backend.migrate import create_index_concurrently
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# Удаленные дубли сохраняются здесь: среди них могут быть оплаченные предсказания
+# (связи предсказания с платежом в этой версии схемы еще нет)
+ARCHIVE_TABLE = "predictions_0001_archive"
+
+# Все предсказания пользователя за день, кроме самого раннего
+DUPLICATE_IDS = """
+    SELECT id FROM (
+        SELECT id, ROW_NUMBER() OVER (
+            PARTITION BY user_id, prediction_date
+            ORDER BY created_at IS NULL, created_at, id
+        ) AS position
+        FROM predictions
+    ) ranked
+    WHERE position > 1
+"""
+
+def upgrade():
+    # Шаг можно повторять: на PostgreSQL индекс строится после коммита очистки,
+    # и если построение прервется (например, приложение успеет записать новый
+    # дубль), повторный запуск доархивирует дубли и построит индекс заново
+    op.execute(f"CREATE TABLE IF NOT EXISTS {ARCHIVE_TABLE} AS SELECT * FROM predictions WHERE 1 = 0")
+    archive = f"""
+        INSERT INTO {ARCHIVE_TABLE}
+        SELECT * FROM predictions
+        WHERE id IN ({DUPLICATE_IDS}) AND id NOT IN (SELECT id FROM {ARCHIVE_TABLE})
+    """
+    if context.is_offline_mode():
+        op.execute(archive)
+    else:
+        archived = op.get_bind().execute(text(archive)).rowcount
+        if archived:
+            logger.warning(
+                f"Moved {archived} duplicate predictions to {ARCHIVE_TABLE}, "
+                f"check them for paid predictions before dropping the table"
+            )
+    op.execute(f"DELETE FROM predictions WHERE id IN (SELECT id FROM {ARCHIVE_TABLE})")
+    create_index_concurrently(
+        "ix_predictions_user_id_prediction_date",
+        "predictions",
+        ["user_id", "prediction_date"],
+        unique=True,
+    )
+
+def downgrade():
+    op.drop_index("ix_predictions_user_id_prediction_date", table_name="predictions")
+    op.execute(f"INSERT INTO predictions SELECT * FROM {ARCHIVE_TABLE}")
+    op.drop_table(ARCHIVE_TABLE)
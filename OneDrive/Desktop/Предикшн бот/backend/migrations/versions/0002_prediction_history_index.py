@@ -0,0 +1,24 @@
+"""Индекс (user_id, created_at, id) для постраничной истории предсказаний
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-06-20
+"""
+from alembic import op
+
+from backend.migrate import create_index_concurrently
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    create_index_concurrently(
+        "ix_predictions_user_id_created_at_id",
+        "predictions",
+        ["user_id", "created_at", "id"],
+    )
+
+def downgrade():
+    op.drop_index("ix_predictions_user_id_created_at_id", table_name="predictions")
@@ -0,0 +1,50 @@
+"""Агрегатные таблицы статистики
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-06-21
+
+После применения заполните таблицы из истории: python -m backend.stats
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Таблицы могли быть уже созданы приложением через create_all
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "user_stats" not in existing:
+        op.create_table(
+            "user_stats",
+            sa.Column("user_id", sa.String(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("total_predictions", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("current_streak", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("longest_streak", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("total_spent", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("last_prediction_date", sa.Date(), nullable=True),
+        )
+    if "daily_stats" not in existing:
+        op.create_table(
+            "daily_stats",
+            sa.Column("day", sa.Date(), primary_key=True),
+            sa.Column("predictions", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("revenue", sa.Integer(), nullable=False, server_default="0"),
+        )
+    if "global_stats" not in existing:
+        op.create_table(
+            "global_stats",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("total_users", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("total_predictions", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("total_revenue", sa.Integer(), nullable=False, server_default="0"),
+        )
+
+def downgrade():
+    op.drop_table("global_stats")
+    op.drop_table("daily_stats")
+    op.drop_table("user_stats")
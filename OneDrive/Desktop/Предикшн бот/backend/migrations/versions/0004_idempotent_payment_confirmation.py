@@ -0,0 +1,50 @@
+"""Связь предсказания с платежом и уникальный telegram_payment_id
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-06-22
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from backend.migrate import (
+    create_foreign_key_not_valid, create_index_concurrently, drop_index_concurrently
+)
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    bind = op.get_bind()
+    columns = {column["name"] for column in sa.inspect(bind).get_columns("predictions")}
+    if bind.dialect.name == "postgresql":
+        # Колонка без значения по умолчанию добавляется без перезаписи таблицы
+        if "payment_id" not in columns:
+            op.add_column("predictions", sa.Column("payment_id", sa.String(), nullable=True))
+        create_foreign_key_not_valid(
+            "fk_predictions_payment_id_payments", "predictions", "payments", ["payment_id"], ["id"]
+        )
+    elif "payment_id" not in columns:
+        # batch: SQLite не умеет добавлять внешний ключ через ALTER
+        with op.batch_alter_table("predictions") as batch_op:
+            batch_op.add_column(sa.Column("payment_id", sa.String(), nullable=True))
+            batch_op.create_foreign_key(
+                "fk_predictions_payment_id_payments", "payments", ["payment_id"], ["id"]
+            )
+    create_index_concurrently("ix_predictions_payment_id", "predictions", ["payment_id"], unique=True)
+
+    # Одно списание Telegram подтверждает ровно один платеж
+    drop_index_concurrently("ix_payments_telegram_payment_id", "payments")
+    create_index_concurrently(
+        "ix_payments_telegram_payment_id", "payments", ["telegram_payment_id"], unique=True
+    )
+
+def downgrade():
+    op.drop_index("ix_payments_telegram_payment_id", table_name="payments")
+    op.create_index("ix_payments_telegram_payment_id", "payments", ["telegram_payment_id"])
+    op.drop_index("ix_predictions_payment_id", table_name="predictions")
+    with op.batch_alter_table("predictions") as batch_op:
+        batch_op.drop_constraint("fk_predictions_payment_id_payments", type_="foreignkey")
+        batch_op.drop_column("payment_id")
@@ -0,0 +1,24 @@
+"""Индекс (status, created_at) для истечения зависших инвойсов
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-06-23
+"""
+from alembic import op
+
+from backend.migrate import create_index_concurrently
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    create_index_concurrently(
+        "ix_payments_status_created_at",
+        "payments",
+        ["status", "created_at"],
+    )
+
+def downgrade():
+    op.drop_index("ix_payments_status_created_at", table_name="payments")
@@ -0,0 +1,33 @@
+"""Подписка пользователя на ежедневную рассылку
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-06-24
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from backend.migrate import create_index_concurrently
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("users")}
+    if "daily_push" not in columns:
+        op.add_column(
+            "users",
+            sa.Column("daily_push", sa.Boolean(), nullable=False, server_default=sa.false())
+        )
+    create_index_concurrently(
+        "ix_users_daily_push_zodiac_sign_id",
+        "users",
+        ["daily_push", "zodiac_sign", "id"],
+    )
+
+def downgrade():
+    op.drop_index("ix_users_daily_push_zodiac_sign_id", table_name="users")
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("daily_push")
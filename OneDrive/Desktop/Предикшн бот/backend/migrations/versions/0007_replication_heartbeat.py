@@ -0,0 +1,25 @@
+"""Отметка репликации для измерения отставания реплик чтения
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-06-26
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Таблица могла быть уже создана приложением через create_all
+    if "replication_heartbeat" not in set(sa.inspect(op.get_bind()).get_table_names()):
+        op.create_table(
+            "replication_heartbeat",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("written_at", sa.DateTime(), nullable=False),
+        )
+
+def downgrade():
+    op.drop_table("replication_heartbeat")
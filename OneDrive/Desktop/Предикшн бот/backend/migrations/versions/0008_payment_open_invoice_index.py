@@ -0,0 +1,22 @@
+"""Индекс (user_id, status, created_at) для поиска открытого инвойса
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2025-06-27
+"""
+from backend.migrate import create_index_concurrently, drop_index_concurrently
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    create_index_concurrently(
+        "ix_payments_user_id_status_created_at",
+        "payments",
+        ["user_id", "status", "created_at"],
+    )
+
+def downgrade():
+    drop_index_concurrently("ix_payments_user_id_status_created_at", "payments")
@@ -0,0 +1,18 @@
+"""Индекс users.updated_at для синхронизации рейтинга
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2025-07-01
+"""
+from backend.migrate import create_index_concurrently, drop_index_concurrently
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    create_index_concurrently("ix_users_updated_at", "users", ["updated_at"])
+
+def downgrade():
+    drop_index_concurrently("ix_users_updated_at", "users")
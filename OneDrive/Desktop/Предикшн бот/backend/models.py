@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from typing import Optional, List
 from datetime import datetime, date
 from enum import Enum
@@ -30,17 +31,29 @@ class UserBase(SQLModel):
     telegram_id: int = Field(unique=True, index=True)
     zodiac_sign: Optional[ZodiacSign] = None
     predictions_count: int = Field(default=0, ge=0)
+    daily_push: bool = Field(default=False)  # ежедневная рассылка предсказания в боте
 
 class User(UserBase, table=True):
     __tablename__ = "users"
+    __table_args__ = (
+        # Получатели рассылки по знакам: WHERE daily_push ORDER BY zodiac_sign, id
+        Index("ix_users_daily_push_zodiac_sign_id", "daily_push", "zodiac_sign", "id"),
+        # Синхронизация рейтинга: WHERE updated_at > отметки
+        Index("ix_users_updated_at", "updated_at"),
+    )
     
     id: Optional[str] = Field(default=None, primary_key=True)
     created_at: Optional[datetime] = Field(default=None)
     updated_at: Optional[datetime] = Field(default=None)
     
-    # Связи
-    predictions: List["Prediction"] = Relationship(back_populates="user")
-    payments: List["Payment"] = Relationship(back_populates="user")
+    # Связи. Ленивая загрузка запрещена (lazy="raise"): обращение к связи без
+    # явной загрузки в запросе дало бы N+1, поэтому оно падает сразу
+    predictions: List["Prediction"] = Relationship(
+        back_populates="user", sa_relationship_kwargs={"lazy": "raise"}
+    )
+    payments: List["Payment"] = Relationship(
+        back_populates="user", sa_relationship_kwargs={"lazy": "raise"}
+    )
 
 class UserCreate(UserBase):
     pass
@@ -48,6 +61,7 @@ class UserCreate(UserBase):
 class UserUpdate(SQLModel):
     first_name: Optional[str] = Field(default=None, min_length=1, max_length=100)
     zodiac_sign: Optional[ZodiacSign] = None
+    daily_push: Optional[bool] = None
 
 class UserPublic(UserBase):
     id: str
@@ -61,13 +75,20 @@ class PredictionBase(SQLModel):
 
 class Prediction(PredictionBase, table=True):
     __tablename__ = "predictions"
+    __table_args__ = (
+        # Не больше одного предсказания на пользователя в день
+        Index("ix_predictions_user_id_prediction_date", "user_id", "prediction_date", unique=True),
+        # Постраничная история: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        Index("ix_predictions_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
     
     id: Optional[str] = Field(default=None, primary_key=True)
     user_id: str = Field(foreign_key="users.id", index=True)
+    payment_id: Optional[str] = Field(default=None, foreign_key="payments.id", unique=True, index=True)
     created_at: Optional[datetime] = Field(default=None)
     
     # Связи
-    user: "User" = Relationship(back_populates="predictions")
+    user: "User" = Relationship(back_populates="predictions", sa_relationship_kwargs={"lazy": "raise"})
 
 class PredictionCreate(PredictionBase):
     pass
@@ -84,15 +105,22 @@ class PaymentBase(SQLModel):
 
 class Payment(PaymentBase, table=True):
     __tablename__ = "payments"
+    __table_args__ = (
+        # Поиск зависших инвойсов воркером: WHERE status = 'pending' AND created_at < ?
+        Index("ix_payments_status_created_at", "status", "created_at"),
+        # Открытый инвойс пользователя: WHERE user_id = ? AND status = 'pending' ORDER BY created_at DESC
+        Index("ix_payments_user_id_status_created_at", "user_id", "status", "created_at"),
+    )
     
     id: Optional[str] = Field(default=None, primary_key=True)
     user_id: str = Field(foreign_key="users.id", index=True)
-    telegram_payment_id: Optional[str] = Field(default=None, index=True)
+    # Идентификатор списания Telegram - ключ идемпотентности подтверждения
+    telegram_payment_id: Optional[str] = Field(default=None, unique=True, index=True)
     created_at: Optional[datetime] = Field(default=None)
     updated_at: Optional[datetime] = Field(default=None)
     
     # Связи
-    user: "User" = Relationship(back_populates="payments")
+    user: "User" = Relationship(back_populates="payments", sa_relationship_kwargs={"lazy": "raise"})
 
 class PaymentCreate(PaymentBase):
     pass
@@ -102,6 +130,9 @@ class PaymentPublic(PaymentBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
 
+class TelegramPaymentConfirmation(SQLModel):
+    telegram_payment_charge_id: str = Field(min_length=1, max_length=255)
+
 # === СТАТИСТИКА ===
 class UserStats(SQLModel):
     user_id: str
@@ -111,6 +142,53 @@ class UserStats(SQLModel):
     total_spent: int  # В XTR Stars
     last_prediction_date: Optional[date] = None
 
+# Агрегаты, обновляемые в транзакции подтверждения платежа
+class UserStatsRollup(SQLModel, table=True):
+    __tablename__ = "user_stats"
+
+    user_id: str = Field(foreign_key="users.id", primary_key=True)
+    total_predictions: int = Field(default=0)
+    current_streak: int = Field(default=0)
+    longest_streak: int = Field(default=0)
+    total_spent: int = Field(default=0)
+    last_prediction_date: Optional[date] = None
+
+class DailyStatsRollup(SQLModel, table=True):
+    __tablename__ = "daily_stats"
+
+    day: date = Field(primary_key=True)
+    predictions: int = Field(default=0)
+    revenue: int = Field(default=0)
+
+class GlobalStatsRollup(SQLModel, table=True):
+    __tablename__ = "global_stats"
+
+    id: int = Field(default=1, primary_key=True)  # Единственная строка
+    total_users: int = Field(default=0)
+    total_predictions: int = Field(default=0)
+    total_revenue: int = Field(default=0)
+
+# === РЕПЛИКАЦИЯ ===
+class ReplicationHeartbeat(SQLModel, table=True):
+    """Отметка времени из основной БД: по ней на репликах считается отставание"""
+    __tablename__ = "replication_heartbeat"
+
+    id: int = Field(default=1, primary_key=True)  # Единственная строка
+    written_at: datetime
+
+class BroadcastRecipient(SQLModel):
+    id: str
+    telegram_id: int
+    zodiac_sign: ZodiacSign
+
+class UserRank(SQLModel):
+    rank: int
+    total_users: int
+    percentile: float  # Доля пользователей с тем же или меньшим числом предсказаний
+    predictions_count: int
+    above: List[UserPublic] = []
+    below: List[UserPublic] = []
+
 class GlobalStats(SQLModel):
     total_users: int
     total_predictions: int
@@ -0,0 +1,157 @@
+"""Обслуживание платежей: истечение зависших инвойсов и отчет о неисполненных списаниях.
+
+Запускается в lifespan API (payment_worker_interval_seconds > 0) или отдельно:
+    python -m backend.payment_worker [--once]
+
+Все изменения - массовые UPDATE с условием на статус, поэтому несколько
+экземпляров воркера могут работать одновременно.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import or_, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .config import settings
+from .database import async_engine
+from .models import Payment, PaymentStatus, Prediction
+
+logger = logging.getLogger(__name__)
+
+class PaymentWorkerStats:
+    """Накопительные метрики воркера платежей"""
+
+    def __init__(self):
+        self.runs = 0
+        self.expired_total = 0
+        self.last_expired = 0
+        self.last_run_at = None
+        self.last_run_seconds = 0.0
+        self.last_expired_per_second = 0.0
+        self.unfulfilled_charges = 0
+        # Списания без предсказания из последнего прохода (не больше batch_size)
+        self.unfulfilled: List[dict] = []
+
+    def snapshot(self) -> dict:
+        return {
+            "runs": self.runs,
+            "expired_total": self.expired_total,
+            "last_expired": self.last_expired,
+            "last_run_at": self.last_run_at,
+            "last_run_seconds": round(self.last_run_seconds, 6),
+            "last_expired_per_second": round(self.last_expired_per_second, 1),
+            "unfulfilled_charges": self.unfulfilled_charges,
+            "unfulfilled": self.unfulfilled
+        }
+
+payment_worker_stats = PaymentWorkerStats()
+
+async def expire_stale_payments(session: AsyncSession, ttl_seconds: int, batch_size: int) -> int:
+    """Перевод инвойсов старше ttl_seconds из pending в failed пачками.
+
+    Каждая пачка - отдельная короткая транзакция, чтобы не держать
+    блокировки на тысячах строк.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl_seconds)
+    total = 0
+    while True:
+        stale = (
+            select(Payment.id)
+            .where(Payment.status == PaymentStatus.PENDING, Payment.created_at < cutoff)
+            .limit(batch_size)
+        )
+        result = await session.exec(
+            update(Payment)
+            # Повторная проверка статуса: инвойс могли оплатить между выборкой и обновлением
+            .where(Payment.id.in_(stale), Payment.status == PaymentStatus.PENDING)
+            .values(status=PaymentStatus.FAILED, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            return total
+
+async def find_unfulfilled_charges(session: AsyncSession, limit: int) -> List[Payment]:
+    """Списания Telegram, по которым пользователь не получил предсказание.
+
+    Списание записывается вместе с подтверждением или, если подтверждение
+    не удалось (предсказание на сегодня уже есть), отдельно в неподтвержденный
+    платеж. Такие платежи нужно разобрать вручную (вернуть Stars).
+    """
+    result = await session.exec(
+        select(Payment)
+        .outerjoin(Prediction, Prediction.payment_id == Payment.id)
+        .where(
+            Payment.telegram_payment_id.is_not(None),
+            or_(Payment.status != PaymentStatus.COMPLETED, Prediction.id.is_(None))
+        )
+        .limit(limit)
+    )
+    return result.all()
+
+async def run_payment_maintenance(
+    ttl_seconds: int = settings.payment_invoice_ttl_seconds,
+    batch_size: int = settings.payment_worker_batch_size
+) -> dict:
+    """Один проход воркера, возвращает метрики"""
+    started = time.perf_counter()
+    async with AsyncSession(async_engine) as session:
+        expired = await expire_stale_payments(session, ttl_seconds, batch_size)
+        unfulfilled = await find_unfulfilled_charges(session, batch_size)
+
+    report = [
+        {
+            "payment_id": payment.id,
+            "telegram_payment_id": payment.telegram_payment_id,
+            "user_id": payment.user_id,
+            "status": payment.status.value,
+            "amount": payment.amount,
+            "updated_at": payment.updated_at
+        }
+        for payment in unfulfilled
+    ]
+    for entry in report:
+        logger.warning(
+            f"Charge {entry['telegram_payment_id']} for payment {entry['payment_id']} "
+            f"of user {entry['user_id']} ({entry['status']}) has no prediction"
+        )
+
+    elapsed = time.perf_counter() - started
+    stats = payment_worker_stats
+    stats.runs += 1
+    stats.expired_total += expired
+    stats.last_expired = expired
+    stats.last_run_at = datetime.utcnow()
+    stats.last_run_seconds = elapsed
+    stats.last_expired_per_second = expired / elapsed if elapsed else 0.0
+    stats.unfulfilled_charges = len(unfulfilled)
+    stats.unfulfilled = report
+    logger.info(f"Payment maintenance: {stats.snapshot()}")
+    return stats.snapshot()
+
+async def run_payment_worker(interval_seconds: int, initial_delay: float = 0):
+    """Периодическое обслуживание платежей; первый проход - через initial_delay секунд"""
+    await asyncio.sleep(initial_delay)
+    while True:
+        try:
+            await run_payment_maintenance()
+        except Exception as e:
+            logger.error(f"Error in payment maintenance: {e}")
+        await asyncio.sleep(interval_seconds)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обслуживание платежей")
+    parser.add_argument("--once", action="store_true", help="один проход и выход")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.once:
+        asyncio.run(run_payment_maintenance())
+    else:
+        asyncio.run(run_payment_worker(settings.payment_worker_interval_seconds or 300))
@@ -0,0 +1,293 @@
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import logging
+import uuid
+
+from fastapi import HTTPException
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .models import User, Prediction, PredictionPublic, Payment, PaymentStatus
+from .predictions import generate_prediction_for_sign
+from .leaderboard import leaderboard
+from .cache import today_predictions, confirmed_payments
+from .auth import invalidate_user_cache
+from .stats import record_prediction
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Поля профиля, которые подтверждение платежа читает из БД, а не из снимка пользователя
+PROFILE_COLUMNS = (User.zodiac_sign, User.first_name, User.daily_push, User.predictions_count)
+
+async def find_today_prediction(
+    user_id: str,
+    session: AsyncSession
+) -> Optional[PredictionPublic]:
+    """Предсказание пользователя на сегодня: сначала кэш, затем БД"""
+    cached = today_predictions.get(user_id)
+    if cached:
+        return cached
+
+    today = datetime.utcnow().date()
+    result = await session.exec(
+        select(Prediction).where(
+            Prediction.user_id == user_id,
+            Prediction.prediction_date == today
+        )
+    )
+    prediction = result.first()
+    if prediction is None:
+        return None
+
+    return today_predictions.set(user_id, prediction)
+
+def seconds_until_next_prediction() -> int:
+    """Секунды до следующих суток по UTC"""
+    now = datetime.utcnow()
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return int((tomorrow - now).total_seconds())
+
+async def find_open_payment(user_id: str, session: AsyncSession) -> Optional[Payment]:
+    """Неистекший инвойс пользователя, который еще ждет оплаты.
+
+    Инвойс с записанным списанием (оплачен, но не исполнен) не переиспользуется.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.payment_invoice_ttl_seconds)
+    result = await session.exec(
+        select(Payment)
+        .where(
+            Payment.user_id == user_id,
+            Payment.status == PaymentStatus.PENDING,
+            Payment.created_at >= cutoff,
+            Payment.telegram_payment_id.is_(None)
+        )
+        .order_by(Payment.created_at.desc())
+        .limit(1)
+    )
+    return result.first()
+
+async def create_pending_payment(user: User, session: AsyncSession) -> Payment:
+    """Инвойс для XTR Stars: открытый инвойс пользователя или новая запись"""
+    payment = await find_open_payment(user.id, session)
+    if payment is not None:
+        return payment
+
+    payment = Payment(
+        id=str(uuid.uuid4()),
+        user_id=user.id,
+        amount=1,  # 1 XTR Star (минимальная единица платежа)
+        currency="XTR",  # Telegram Stars
+        status=PaymentStatus.PENDING,
+        created_at=datetime.utcnow()
+    )
+
+    session.add(payment)
+    # Все поля заданы здесь, а expire_on_commit=False: refresh был бы лишним SELECT
+    await session.commit()
+    return payment
+
+async def complete_payment(
+    payment_id: str,
+    user: User,
+    session: AsyncSession,
+    telegram_payment_id: Optional[str] = None
+) -> PredictionPublic:
+    """Подтверждение платежа и создание предсказания одной транзакцией.
+
+    Платеж переводится из pending в completed условным UPDATE: из
+    параллельных подтверждений его выполнит только одно, остальные
+    получат уже созданное предсказание. Повторы с тем же платежом
+    (и тем же telegram_payment_id) идемпотентны.
+
+    Знак зодиака и имя берутся из строки пользователя в этой же транзакции:
+    user - снимок из кэша авторизации и мог устареть.
+    """
+    cached = confirmed_payments.get(payment_id)
+    if cached:
+        return _replay(cached, user, telegram_payment_id)
+
+    # После rollback атрибуты user истекают, id нужен для разбора конфликта
+    user_id = user.id
+    now = datetime.utcnow()
+    try:
+        amount = await _claim_payment(payment_id, user, session, telegram_payment_id, now)
+        if amount is None:
+            return await _replay_from_db(payment_id, user, session, telegram_payment_id)
+
+        # Счетчик увеличивается в БД, без чтения и записи всей строки
+        result = await session.exec(
+            update(User)
+            .where(User.id == user.id)
+            .values(predictions_count=User.predictions_count + 1, updated_at=now)
+            .returning(*PROFILE_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        profile = result.one()._asdict()
+        if not profile["zodiac_sign"]:
+            await session.rollback()
+            if telegram_payment_id:
+                await _record_unfulfilled_charge(
+                    payment_id, user_id, session, telegram_payment_id, now, "no zodiac sign"
+                )
+            raise HTTPException(status_code=400, detail="Сначала выберите знак зодиака")
+
+        prediction = Prediction(
+            id=str(uuid.uuid4()),
+            user_id=user.id,
+            payment_id=payment_id,
+            zodiac_sign=profile["zodiac_sign"],
+            prediction_text=generate_prediction_for_sign(profile["zodiac_sign"]),
+            prediction_date=now.date(),
+            created_at=now
+        )
+        session.add(prediction)
+        await record_prediction(session, user.id, now.date(), amount)
+
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        await _raise_conflict(payment_id, user_id, session, telegram_payment_id, now)
+
+    snapshot = PredictionPublic.model_validate(prediction)
+    for name, value in profile.items():
+        set_committed_value(user, name, value)
+    set_committed_value(user, "updated_at", now)
+    invalidate_user_cache(user.id)
+    leaderboard.upsert(user)
+    today_predictions.set(user.id, snapshot)
+    confirmed_payments.set(payment_id, (user.id, telegram_payment_id, snapshot))
+
+    return snapshot
+
+async def _claim_payment(
+    payment_id: str,
+    user: User,
+    session: AsyncSession,
+    telegram_payment_id: Optional[str],
+    now: datetime
+) -> Optional[int]:
+    """Перевод платежа pending -> completed, возвращает сумму или None.
+
+    Строка платежа блокируется до конца транзакции, поэтому параллельный
+    захват того же платежа дождется коммита и не найдет pending.
+    Истекший инвойс (failed) тоже принимается: пользователь мог оплатить
+    его уже после истечения, деньги списаны.
+    """
+    values = {"status": PaymentStatus.COMPLETED, "updated_at": now}
+    if telegram_payment_id:
+        values["telegram_payment_id"] = telegram_payment_id
+
+    result = await session.exec(
+        update(Payment)
+        .where(
+            Payment.id == payment_id,
+            Payment.user_id == user.id,
+            Payment.status.in_([PaymentStatus.PENDING, PaymentStatus.FAILED])
+        )
+        .values(**values)
+        .returning(Payment.amount)
+        .execution_options(synchronize_session=False)
+    )
+    return result.scalar_one_or_none()
+
+def _replay(
+    cached: Tuple[str, Optional[str], PredictionPublic],
+    user: User,
+    telegram_payment_id: Optional[str]
+) -> PredictionPublic:
+    """Результат уже подтвержденного платежа"""
+    user_id, confirmed_charge_id, prediction = cached
+    if user_id != user.id:
+        raise HTTPException(status_code=404, detail="Платеж не найден")
+    if telegram_payment_id and confirmed_charge_id and telegram_payment_id != confirmed_charge_id:
+        # Второе списание по одному инвойсу - его нужно вернуть пользователю
+        logger.warning(
+            f"Payment already confirmed with charge {confirmed_charge_id}, "
+            f"got another charge {telegram_payment_id}"
+        )
+        raise HTTPException(status_code=409, detail="Платеж уже подтвержден другим списанием")
+    return prediction
+
+async def _replay_from_db(
+    payment_id: str,
+    user: User,
+    session: AsyncSession,
+    telegram_payment_id: Optional[str]
+) -> PredictionPublic:
+    """Повторное подтверждение, которого нет в кэше процесса"""
+    payment = await session.get(Payment, payment_id)
+    if payment is None or payment.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Платеж не найден")
+    if payment.status != PaymentStatus.COMPLETED:
+        raise HTTPException(status_code=400, detail="Платеж уже обработан")
+
+    result = await session.exec(select(Prediction).where(Prediction.payment_id == payment_id))
+    prediction = result.first()
+    if prediction is None:
+        # Платеж подтвержден до появления связи с предсказанием
+        raise HTTPException(status_code=400, detail="Платеж уже обработан")
+
+    cached = (payment.user_id, payment.telegram_payment_id, PredictionPublic.model_validate(prediction))
+    confirmed_payments.set(payment_id, cached)
+    return _replay(cached, user, telegram_payment_id)
+
+async def _raise_conflict(
+    payment_id: str,
+    user_id: str,
+    session: AsyncSession,
+    telegram_payment_id: Optional[str],
+    now: datetime
+):
+    """Причина нарушения уникальности при подтверждении"""
+    if telegram_payment_id:
+        result = await session.exec(
+            select(Payment.id).where(Payment.telegram_payment_id == telegram_payment_id)
+        )
+        other_payment_id = result.first()
+        if other_payment_id and other_payment_id != payment_id:
+            raise HTTPException(status_code=409, detail="Списание уже использовано для другого платежа")
+        # Деньги списаны, а предсказание не выдано: списание сохраняется для воркера платежей
+        await _record_unfulfilled_charge(
+            payment_id, user_id, session, telegram_payment_id, now, "prediction for today already exists"
+        )
+    # Предсказание на сегодня уже создано другим платежом
+    raise HTTPException(status_code=400, detail="Предсказание на сегодня уже получено")
+
+async def _record_unfulfilled_charge(
+    payment_id: str,
+    user_id: str,
+    session: AsyncSession,
+    telegram_payment_id: str,
+    now: datetime,
+    reason: str
+):
+    """Запись списания в неподтвержденный платеж отдельной транзакцией.
+
+    Подтверждение откатилось, поэтому без этой записи списание нигде бы не
+    осталось. Статус платежа не меняется: такие платежи (списание есть,
+    предсказания нет) показывает воркер платежей для возврата Stars.
+    """
+    try:
+        await session.exec(
+            update(Payment)
+            .where(
+                Payment.id == payment_id,
+                Payment.user_id == user_id,
+                Payment.status.in_([PaymentStatus.PENDING, PaymentStatus.FAILED]),
+                Payment.telegram_payment_id.is_(None)
+            )
+            .values(telegram_payment_id=telegram_payment_id, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        return
+    logger.warning(
+        f"Charge {telegram_payment_id} for payment {payment_id} of user {user_id} "
+        f"was not fulfilled: {reason}"
+    )
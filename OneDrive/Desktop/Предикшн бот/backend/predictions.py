@@ -1,202 +1,83 @@
-import random
-from datetime import datetime
+import asyncio
+import hashlib
+import hmac
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
 from .models import ZodiacSign
+from .config import settings
 
-# Словарь предсказаний для каждого знака зодиака
-PREDICTIONS = {
-    ZodiacSign.ARIES: [
-        "Сегодня ваша энергия будет на пике! Используйте её для достижения важных целей.",
-        "Звёзды советуют быть более терпеливым в отношениях с близкими людьми.",
-        "Отличный день для новых начинаний. Ваша инициатива будет вознаграждена.",
-        "Будьте осторожны с финансовыми решениями. Лучше отложить крупные покупки.",
-        "Ваша харизма сегодня особенно сильна. Используйте это в деловых переговорах."
-    ],
-    ZodiacSign.TAURUS: [
-        "Сегодня особенно важно уделить время своему здоровью и отдыху.",
-        "Финансовая стабильность приближается. Продолжайте работать над своими целями.",
-        "В любовных отношениях ожидается приятный сюрприз.",
-        "Ваша настойчивость скоро принесёт плоды. Не сдавайтесь!",
-        "Отличный день для творчества и самовыражения."
-    ],
-    ZodiacSign.GEMINI: [
-        "Сегодня ваше общение будет особенно продуктивным. Заводите новые знакомства!",
-        "Переменчивость настроения может помешать важным решениям. Будьте внимательны.",
-        "Удачный день для обучения и получения новых знаний.",
-        "В семейных отношениях возможны приятные изменения.",
-        "Ваша интуиция сегодня работает на отлично. Доверьтесь ей."
-    ],
-    ZodiacSign.CANCER: [
-        "Сегодня особенно важно прислушаться к своим эмоциям и чувствам.",
-        "Семья и дом требуют вашего внимания. Не пренебрегайте близкими.",
-        "Ваша забота о других вернётся к вам троекратно.",
-        "Хороший день для решения старых проблем и конфликтов.",
-        "Доверьтесь своей интуиции в принятии важных решений."
-    ],
-    ZodiacSign.LEO: [
-        "Сегодня вы будете в центре внимания! Используйте это с умом.",
-        "Ваши лидерские качества помогут решить сложную ситуацию.",
-        "В творческих проектах ожидается значительный прорыв.",
-        "Будьте щедрыми, но не забывайте о собственных интересах.",
-        "Романтические отношения выйдут на новый уровень."
-    ],
-    ZodiacSign.VIRGO: [
-        "Ваше внимание к деталям сегодня будет особенно ценным.",
-        "Отличный день для планирования и организации дел.",
-        "Здоровье требует внимания. Не игнорируйте сигналы организма.",
-        "В работе возможны значительные достижения благодаря вашей точности.",
-        "Помощь другим принесёт неожиданную пользу и вам."
-    ],
-    ZodiacSign.LIBRA: [
-        "Сегодня важно найти баланс между работой и личной жизнью.",
-        "Ваше чувство справедливости поможет разрешить спорную ситуацию.",
-        "В отношениях наступает период гармонии и понимания.",
-        "Красота и искусство принесут особое вдохновение.",
-        "Партнёрство в делах обещает быть очень успешным."
-    ],
-    ZodiacSign.SCORPIO: [
-        "Ваша интуиция сегодня невероятно сильна. Доверьтесь ей полностью.",
-        "Глубокие изменения в жизни начинаются именно сегодня.",
-        "В отношениях возможна эмоциональная интенсивность. Будьте мудры.",
-        "Финансовые вопросы требуют серьёзного подхода и анализа.",
-        "Ваша способность к трансформации поможет преодолеть любые препятствия."
-    ],
-    ZodiacSign.SAGITTARIUS: [
-        "Сегодня отличный день для путешествий и новых открытий!",
-        "Ваш оптимизм заразителен и помогает окружающим.",
-        "Образование и самосовершенствование принесут неожиданные возможности.",
-        "Философские размышления приведут к важным выводам.",
-        "Свобода и независимость сегодня особенно важны для вас."
-    ],
-    ZodiacSign.CAPRICORN: [
-        "Ваша целеустремлённость сегодня поможет достичь важной цели.",
-        "Карьерные вопросы требуют серьёзного и ответственного подхода.",
-        "Традиции и семейные ценности играют важную роль в принятии решений.",
-        "Терпение и упорство скоро принесут заслуженные плоды.",
-        "Ваш практичный подход к жизни будет особенно ценен сегодня."
-    ],
-    ZodiacSign.AQUARIUS: [
-        "Ваша оригинальность и креативность откроют новые возможности.",
-        "Дружба и социальные связи играют ключевую роль в сегодняшних событиях.",
-        "Технологии и инновации принесут неожиданные решения проблем.",
-        "Ваша независимость мышления поможет найти уникальный выход.",
-        "Гуманитарные вопросы требуют вашего внимания и участия."
-    ],
-    ZodiacSign.PISCES: [
-        "Сегодня ваша интуиция и эмпатия будут особенно сильными.",
-        "Творчество и искусство принесут глубокое удовлетворение.",
-        "Духовные вопросы требуют вашего внимания и размышлений.",
-        "В отношениях важна эмоциональная близость и понимание.",
-        "Ваша способность к состраданию поможет кому-то в трудную минуту."
-    ]
-}
+logger = logging.getLogger(__name__)
 
-def generate_prediction_for_sign(zodiac_sign: ZodiacSign) -> str:
-    """Генерация случайного предсказания для знака зодиака"""
-    if zodiac_sign not in PREDICTIONS:
-        return "Звёзды сегодня молчат, но завтра обязательно откроют свои секреты."
-    
-    predictions_list = PREDICTIONS[zodiac_sign]
-    
-    # Используем дату для создания псевдослучайности (одинаковое предсказание для одного дня)
-    today = datetime.now().date()
-    seed = hash(f"{zodiac_sign}_{today}")
-    random.seed(seed)
+# Тексты по знакам (prediction_texts.PREDICTIONS), загружаются при первом обращении
+_corpus: Optional[Dict[ZodiacSign, List[str]]] = None
+
+FALLBACK_PREDICTION = "Звёзды сегодня молчат, но завтра обязательно откроют свои секреты."
+
+# Таблицы предсказаний по дням: дата -> знак -> текст
+_daily_tables: Dict[date, Dict[ZodiacSign, str]] = {}
+
+def get_corpus() -> Dict[ZodiacSign, List[str]]:
+    """Тексты предсказаний по знакам; модуль с текстами импортируется при первом вызове"""
+    global _corpus
+    if _corpus is None:
+        from .prediction_texts import PREDICTIONS
+        _corpus = PREDICTIONS
+    return _corpus
+
+def _pick_index(zodiac_sign: ZodiacSign, day: date, size: int) -> int:
+    """Стабильный индекс предсказания для пары (знак, дата).
+
+    HMAC-SHA256 не зависит от PYTHONHASHSEED, поэтому все воркеры и
+    узлы с одинаковым ключом выбирают одно и то же предсказание.
+    """
+    message = f"{zodiac_sign.value}:{day.isoformat()}".encode()
+    digest = hmac.new(settings.prediction_hash_key.encode(), message, hashlib.sha256).digest()
+    return int.from_bytes(digest[:8], "big") % size
+
+def build_daily_table(day: date) -> Dict[ZodiacSign, str]:
+    """Расчёт предсказаний всех знаков на заданную дату"""
+    return {
+        sign: predictions_list[_pick_index(sign, day, len(predictions_list))]
+        for sign, predictions_list in get_corpus().items()
+    }
+
+def get_daily_table(day: date) -> Dict[ZodiacSign, str]:
+    """Таблица предсказаний на дату, рассчитывается один раз"""
+    table = _daily_tables.get(day)
+    if table is None:
+        table = build_daily_table(day)
+        _daily_tables[day] = table
+    return table
+
+def prewarm_daily_tables(days_ahead: int, today: Optional[date] = None):
+    """Расчёт таблиц на сегодня и days_ahead дней вперёд, удаление прошедших дней"""
+    today = today or datetime.utcnow().date()
+    for offset in range(days_ahead + 1):
+        get_daily_table(today + timedelta(days=offset))
+    for day in [day for day in _daily_tables if day < today - timedelta(days=1)]:
+        del _daily_tables[day]
+
+async def run_daily_tables_prewarm(days_ahead: int, interval_seconds: int = 3600):
+    """Фоновая задача прогрева таблиц предсказаний"""
+    while True:
+        try:
+            prewarm_daily_tables(days_ahead)
+        except Exception as e:
+            logger.error(f"Error prewarming prediction tables: {e}")
+        await asyncio.sleep(interval_seconds)
+
+def generate_prediction_for_sign(zodiac_sign: ZodiacSign, day: Optional[date] = None) -> str:
+    """Предсказание для знака зодиака на дату (по умолчанию - сегодня по UTC)"""
+    if zodiac_sign not in get_corpus():
+        return FALLBACK_PREDICTION
     
-    return random.choice(predictions_list)
+    # Одинаковое предсказание для одного знака в течение дня
+    day = day or datetime.utcnow().date()
+    return get_daily_table(day)[zodiac_sign]
 
 def get_zodiac_info(zodiac_sign: ZodiacSign) -> dict:
     """Получение информации о знаке зодиака"""
-    zodiac_info = {
-        ZodiacSign.ARIES: {
-            "name": "aries",
-            "title": "Овен",
-            "emoji": "♈",
-            "element": "Огонь",
-            "dates": "21 марта — 19 апреля"
-        },
-        ZodiacSign.TAURUS: {
-            "name": "taurus",
-            "title": "Телец",
-            "emoji": "♉",
-            "element": "Земля",
-            "dates": "20 апреля — 20 мая"
-        },
-        ZodiacSign.GEMINI: {
-            "name": "gemini",
-            "title": "Близнецы",
-            "emoji": "♊",
-            "element": "Воздух",
-            "dates": "21 мая — 20 июня"
-        },
-        ZodiacSign.CANCER: {
-            "name": "cancer",
-            "title": "Рак",
-            "emoji": "♋",
-            "element": "Вода",
-            "dates": "21 июня — 22 июля"
-        },
-        ZodiacSign.LEO: {
-            "name": "leo",
-            "title": "Лев",
-            "emoji": "♌",
-            "element": "Огонь",
-            "dates": "23 июля — 22 августа"
-        },
-        ZodiacSign.VIRGO: {
-            "name": "virgo",
-            "title": "Дева",
-            "emoji": "♍",
-            "element": "Земля",
-            "dates": "23 августа — 22 сентября"
-        },
-        ZodiacSign.LIBRA: {
-            "name": "libra",
-            "title": "Весы",
-            "emoji": "♎",
-            "element": "Воздух",
-            "dates": "23 сентября — 22 октября"
-        },
-        ZodiacSign.SCORPIO: {
-            "name": "scorpio",
-            "title": "Скорпион",
-            "emoji": "♏",
-            "element": "Вода",
-            "dates": "23 октября — 21 ноября"
-        },
-        ZodiacSign.SAGITTARIUS: {
-            "name": "sagittarius",
-            "title": "Стрелец",
-            "emoji": "♐",
-            "element": "Огонь",
-            "dates": "22 ноября — 21 декабря"
-        },
-        ZodiacSign.CAPRICORN: {
-            "name": "capricorn",
-            "title": "Козерог",
-            "emoji": "♑",
-            "element": "Земля",
-            "dates": "22 декабря — 19 января"
-        },
-        ZodiacSign.AQUARIUS: {
-            "name": "aquarius",
-            "title": "Водолей",
-            "emoji": "♒",
-            "element": "Воздух",
-            "dates": "20 января — 18 февраля"
-        },
-        ZodiacSign.PISCES: {
-            "name": "pisces",
-            "title": "Рыбы",
-            "emoji": "♓",
-            "element": "Вода",
-            "dates": "19 февраля — 20 марта"
-        }
-    }
-    
-    return zodiac_info.get(zodiac_sign, {
-        "name": "unknown",
-        "title": "Неизвестный",
-        "emoji": "❓",
-        "element": "Неизвестно",
-        "dates": "Неизвестно"
-    }) 
\ No newline at end of file
+    from .prediction_texts import UNKNOWN_ZODIAC_INFO, ZODIAC_INFO
+
+    return ZODIAC_INFO.get(zodiac_sign, UNKNOWN_ZODIAC_INFO)
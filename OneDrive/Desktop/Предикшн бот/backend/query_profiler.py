@@ -0,0 +1,226 @@
+"""Профилировщик SQL по HTTP-запросам: бюджеты маршрутов, N+1 и повторы.
+
+Включается настройкой query_profiler_enabled (QUERY_PROFILER_ENABLED=true) -
+в продакшене выключен, потому что хранит тексты всех выражений запроса.
+Значения параметров в отчеты не попадают (в них бывают персональные данные
+и идентификаторы платежей), пока не включена отладочная настройка
+query_profiler_include_params; повторы и N+1 находятся по ним в любом случае.
+MetricsMiddleware собирает выражения каждого HTTP-запроса, после
+ответа профилировщик проверяет их:
+- over_budget - выражений больше, чем разрешено маршруту в QUERY_BUDGETS;
+- duplicate - одно и то же выражение с теми же параметрами повторилось;
+- n_plus_one - одно выражение выполнено много раз с разными параметрами;
+- reload_after_commit - строка перечитана после коммита своей же записи
+  (refresh при expire_on_commit=False).
+
+Отчеты с нарушениями пишутся в лог, последние отчеты доступны на
+GET /internal/db/queries и (при query_profiler_report_path) дописываются
+в файл JSON Lines. Проверка бюджетов всех маршрутов:
+    python benchmarks/query_budget.py
+"""
+import logging
+import re
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import orjson
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Максимум SQL-выражений на запрос по "МЕТОД шаблон-пути" при холодных кэшах;
+# остальные маршруты - query_profiler_default_budget
+QUERY_BUDGETS: Dict[str, int] = {
+    "GET /": 0,
+    "GET /zodiac-signs": 0,
+    "GET /users/rankings": 0,
+    "GET /users/me": 1,
+    "GET /users/me/rank": 1,
+    "GET /users/me/stats": 2,
+    "PATCH /users/me": 2,
+    "POST /users/": 3,
+    "GET /predictions/": 2,
+    "GET /predictions/today": 2,
+    "GET /predictions/can-purchase": 2,
+    "POST /payments/create-invoice": 4,
+    "POST /payments/{payment_id}/confirm": 7,
+    "POST /internal/telegram/{telegram_id}/purchase": 4,
+    "GET /internal/telegram/{telegram_id}/payments/{payment_id}": 2,
+    "POST /internal/telegram/{telegram_id}/payments/{payment_id}/confirm": 7,
+    "GET /internal/broadcast/recipients": 1,
+    "GET /internal/broadcast/texts": 0,
+    "GET /stats": 2,
+}
+
+COMMIT = "COMMIT"
+
+_WHITESPACE = re.compile(r"\s+")
+_NUMBERED_PARAM = re.compile(r"\$\d+")
+# Раскрытые списки (?, ?, ?) в IN и VALUES сворачиваются, чтобы длина не меняла отпечаток
+_IN_LIST = re.compile(r"\(\?(?:, \?)+\)")
+_WRITE_TABLE = re.compile(r"^(?:INSERT INTO|UPDATE)\s+\"?(\w+)", re.IGNORECASE)
+_SELECT_BY_ID = re.compile(r"^SELECT .+? FROM \"?(\w+)\"? WHERE \"?\1\"?\.id = \?$", re.IGNORECASE)
+
+def fingerprint(statement: str) -> str:
+    """Текст выражения без различий в пробелах, номерах и числе параметров"""
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    return _IN_LIST.sub("(?)", _NUMBERED_PARAM.sub("?", statement))
+
+@dataclass
+class QueryIssue:
+    kind: str
+    statement: str
+    count: int
+
+@dataclass
+class QueryReport:
+    """SQL-выражения одного HTTP-запроса и найденные проблемы"""
+    method: str
+    route: str
+    status: int
+    queries: int
+    seconds: float
+    budget: int
+    statements: List[dict] = field(default_factory=list)
+    issues: List[QueryIssue] = field(default_factory=list)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.queries > self.budget
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["over_budget"] = self.over_budget
+        return data
+
+    def format(self) -> str:
+        """Текстовый отчет для лога"""
+        lines = [
+            f"{self.method} {self.route} -> {self.status}: {self.queries} queries "
+            f"(budget {self.budget}), {self.seconds * 1000:.2f} ms in DB"
+        ]
+        for issue in self.issues:
+            lines.append(f"  {issue.kind} x{issue.count}: {issue.statement}")
+        for i, statement in enumerate(self.statements, 1):
+            params = f"  {statement['params']}" if statement["params"] is not None else ""
+            lines.append(f"  {i:>3}. {statement['ms']:>8.3f} ms  {statement['sql']}{params}")
+        return "\n".join(lines)
+
+def _find_issues(statements: Sequence[Tuple[str, object, float]], n_plus_one_threshold: int) -> List[QueryIssue]:
+    issues = []
+    executions: Dict[str, List[str]] = {}
+    written_tables = set()
+    committed_tables = set()
+    reloads: Dict[str, int] = {}
+
+    for statement, parameters, _ in statements:
+        if statement == COMMIT:
+            committed_tables |= written_tables
+            continue
+        text = fingerprint(statement)
+        executions.setdefault(text, []).append(repr(parameters))
+
+        write = _WRITE_TABLE.match(text)
+        if write:
+            written_tables.add(write.group(1))
+            continue
+        reload = _SELECT_BY_ID.match(text)
+        if reload and reload.group(1) in committed_tables:
+            reloads[text] = reloads.get(text, 0) + 1
+
+    for text, parameters in executions.items():
+        repeated = len(parameters) - len(set(parameters))
+        if repeated:
+            issues.append(QueryIssue("duplicate", text, repeated + 1))
+        if len(set(parameters)) >= n_plus_one_threshold:
+            issues.append(QueryIssue("n_plus_one", text, len(set(parameters))))
+    for text, count in reloads.items():
+        issues.append(QueryIssue("reload_after_commit", text, count))
+    return issues
+
+class QueryProfiler:
+    """Проверка SQL-выражений каждого запроса и хранение последних отчетов"""
+
+    def __init__(
+        self,
+        budgets: Dict[str, int] = QUERY_BUDGETS,
+        default_budget: int = 10,
+        n_plus_one_threshold: int = 3,
+        history_size: int = 100,
+        report_path: Optional[str] = None,
+        include_params: bool = False
+    ):
+        self.budgets = budgets
+        self.default_budget = default_budget
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.report_path = report_path
+        self.include_params = include_params
+        self.reports: Deque[QueryReport] = deque(maxlen=history_size)
+        self.requests = 0
+        # маршрут -> число запросов с нарушениями
+        self.violations: Dict[str, int] = {}
+
+    def budget_for(self, method: str, route: str) -> int:
+        return self.budgets.get(f"{method} {route}", self.default_budget)
+
+    def analyze(
+        self,
+        method: str,
+        route: str,
+        status: int,
+        statements: Sequence[Tuple[str, object, float]]
+    ) -> QueryReport:
+        """Отчет по выражениям запроса; нарушения пишутся в лог и в файл отчетов"""
+        executed = [item for item in statements if item[0] != COMMIT]
+        report = QueryReport(
+            method=method,
+            route=route,
+            status=status,
+            queries=len(executed),
+            seconds=sum(elapsed for _, _, elapsed in executed),
+            budget=self.budget_for(method, route),
+            statements=[
+                {
+                    "sql": fingerprint(statement),
+                    "params": repr(parameters) if self.include_params else None,
+                    "ms": round(elapsed * 1000, 3)
+                }
+                for statement, parameters, elapsed in statements
+            ],
+            issues=_find_issues(statements, self.n_plus_one_threshold)
+        )
+        self.requests += 1
+        self.reports.append(report)
+
+        if report.over_budget or report.issues:
+            key = f"{method} {route}"
+            self.violations[key] = self.violations.get(key, 0) + 1
+            logger.warning(f"Query profile:\n{report.format()}")
+        if self.report_path:
+            with open(self.report_path, "ab") as f:
+                f.write(orjson.dumps(report.to_dict()) + b"\n")
+        return report
+
+    def reset(self):
+        self.reports.clear()
+        self.requests = 0
+        self.violations.clear()
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": settings.query_profiler_enabled,
+            "include_params": self.include_params,
+            "requests": self.requests,
+            "violations": dict(self.violations),
+            "recent": [report.to_dict() for report in self.reports]
+        }
+
+query_profiler = QueryProfiler(
+    default_budget=settings.query_profiler_default_budget,
+    n_plus_one_threshold=settings.query_profiler_n_plus_one_threshold,
+    history_size=settings.query_profiler_history_size,
+    report_path=settings.query_profiler_report_path,
+    include_params=settings.query_profiler_include_params
+)
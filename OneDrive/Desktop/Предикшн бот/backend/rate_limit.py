@@ -0,0 +1,217 @@
+"""Ограничение частоты запросов: token bucket на клиента и маршрут.
+
+Клиент определяется по пользователю из JWT, по telegram_id во внутренних
+маршрутах бота (только с верным X-Internal-Token) или по IP. У каждого
+маршрута свой бюджет, поэтому частый опрос /predictions/can-purchase не
+расходует бюджет платежей. Запросы бота без telegram_id в пути не
+ограничиваются.
+
+Состояние bucket'ов хранится в памяти процесса (rate_limit_backend=memory)
+или в Redis (rate_limit_backend=redis), чтобы несколько воркеров делили
+один бюджет. Redis - необязательная зависимость: pip install redis.
+"""
+import hmac
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import orjson
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .auth import decode_token
+from .config import settings
+from .metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED = Counter("http_rate_limited_total", "Requests rejected with 429 by rate limiting", ("route",))
+
+@dataclass(frozen=True)
+class RateBudget:
+    """Бюджет маршрута: rate запросов в секунду, всплеск до burst"""
+    rate: float
+    burst: int
+
+# Бюджеты на одного клиента по "МЕТОД шаблон-пути"; остальные маршруты - по умолчанию
+ROUTE_BUDGETS: Dict[str, RateBudget] = {
+    "GET /predictions/can-purchase": RateBudget(rate=0.5, burst=10),
+    "GET /users/rankings": RateBudget(rate=1, burst=20),
+    "GET /users/me/rank": RateBudget(rate=1, burst=10),
+    "GET /predictions/export": RateBudget(rate=1 / 60, burst=3),
+    "POST /users/": RateBudget(rate=0.1, burst=5),
+    "POST /payments/create-invoice": RateBudget(rate=0.2, burst=5),
+    "POST /payments/{payment_id}/confirm": RateBudget(rate=1, burst=10),
+    "POST /internal/telegram/{telegram_id}/purchase": RateBudget(rate=0.2, burst=5),
+    "POST /internal/telegram/{telegram_id}/payments/{payment_id}/confirm": RateBudget(rate=1, burst=10),
+}
+
+class MemoryRateLimitBackend:
+    """Bucket'ы в памяти процесса; самые старые вытесняются при переполнении"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, budget: RateBudget) -> float:
+        """Списание токена; 0 - запрос разрешен, иначе секунды до следующего токена"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (budget.burst, now))
+        tokens = min(budget.burst, tokens + (now - updated) * budget.rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / budget.rate
+
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    async def close(self):
+        self._buckets.clear()
+
+# Тот же token bucket атомарно на стороне Redis, по часам сервера Redis
+REDIS_TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(retry_after)
+"""
+
+class RedisRateLimitBackend:
+    """Общие для всех воркеров bucket'ы в Redis"""
+
+    def __init__(self, url: str, prefix: str = "rate_limit:"):
+        try:
+            from redis import asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("rate_limit_backend=redis требует пакет redis (pip install redis)") from e
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(REDIS_TOKEN_BUCKET)
+
+    async def take(self, key: str, budget: RateBudget) -> float:
+        try:
+            retry_after = await self._script(keys=[self.prefix + key], args=[budget.rate, budget.burst])
+        except Exception as e:
+            # Недоступный Redis не должен останавливать API: пропускаем запрос
+            logger.warning(f"Rate limit backend error: {e}")
+            return 0.0
+        return float(retry_after)
+
+    async def close(self):
+        await self._client.aclose()
+
+def create_rate_limit_backend():
+    if settings.rate_limit_backend == "memory":
+        return MemoryRateLimitBackend(settings.rate_limit_max_keys)
+    if settings.rate_limit_backend == "redis":
+        if not settings.rate_limit_redis_url:
+            raise RuntimeError("rate_limit_backend=redis требует rate_limit_redis_url")
+        return RedisRateLimitBackend(settings.rate_limit_redis_url)
+    raise RuntimeError(f"Unknown rate_limit_backend: {settings.rate_limit_backend}")
+
+class RateLimitMiddleware:
+    """ASGI-middleware: 429 с Retry-After при исчерпании бюджета клиента"""
+
+    def __init__(self, app: ASGIApp, backend, budgets: Dict[str, RateBudget] = ROUTE_BUDGETS):
+        self.app = app
+        self.backend = backend
+        self.budgets = budgets
+        self.default_budget = RateBudget(
+            rate=settings.rate_limit_default_rate,
+            burst=settings.rate_limit_default_burst
+        )
+        # (метод, путь) -> шаблон для маршрутов без параметров: их конечное число
+        self._static_routes: Dict[Tuple[str, str], str] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        route_path, path_params = self._match_route(scope)
+        # Шаблон нужен и метрикам, если запрос будет отклонен до маршрутизатора
+        scope["route_path"] = route_path
+        client_key = self._client_key(scope, headers, path_params)
+        if client_key is None:
+            await self.app(scope, receive, send)
+            return
+
+        route_key = f"{scope['method']} {route_path}" if route_path else "*"
+        budget = self.budgets.get(route_key, self.default_budget)
+        retry_after = await self.backend.take(f"{route_key}|{client_key}", budget)
+        if retry_after <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        RATE_LIMITED.inc((route_key,))
+        body = orjson.dumps({"detail": "Too Many Requests"})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def _match_route(self, scope: Scope) -> Tuple[Optional[str], dict]:
+        """Шаблон пути маршрута и его параметры (до выполнения маршрутизации)"""
+        static_key = (scope["method"], scope["path"])
+        route_path = self._static_routes.get(static_key)
+        if route_path is not None:
+            return route_path, {}
+
+        for route in scope["app"].router.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                path_params = child_scope.get("path_params", {})
+                if not path_params:
+                    self._static_routes[static_key] = route.path
+                return route.path, path_params
+        return None, {}
+
+    @staticmethod
+    def _client_key(scope: Scope, headers: dict, path_params: dict) -> Optional[str]:
+        """Ключ клиента; None - доверенный запрос бота без ограничения"""
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and token:
+            payload = decode_token(token)
+            if payload is not None:
+                return f"user:{payload['sub']}"
+
+        internal_token = headers.get(b"x-internal-token", b"").decode("latin-1")
+        if internal_token and settings.internal_api_token and hmac.compare_digest(
+            internal_token, settings.internal_api_token
+        ):
+            telegram_id = path_params.get("telegram_id")
+            return f"tg:{telegram_id}" if telegram_id is not None else None
+
+        if settings.rate_limit_trust_forwarded_for and b"x-forwarded-for" in headers:
+            return "ip:" + headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return f"ip:{client[0]}" if client else "ip:unknown"
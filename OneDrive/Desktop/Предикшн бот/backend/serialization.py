@@ -0,0 +1,27 @@
+"""Быстрая сериализация ответов через orjson.
+
+Строки из БД и снимки рейтинга уже прошли валидацию при записи, поэтому
+для ответа достаточно взять поля публичной модели и отдать их orjson,
+без повторной проверки через response_model и jsonable_encoder.
+"""
+from typing import Any, Dict, Optional, Type
+
+import orjson
+from fastapi import Response
+from sqlmodel import SQLModel
+
+def public_fields(model: Type[SQLModel], row: Any) -> Dict[str, Any]:
+    """Поля публичной модели из строки БД или снимка, без валидации"""
+    return {name: getattr(row, name) for name in model.model_fields}
+
+def dump_public(model: Type[SQLModel], data: Optional[Any]) -> bytes:
+    """JSON публичной модели (или списка моделей) из доверенных строк"""
+    if data is None:
+        return b"null"
+    if isinstance(data, (list, tuple)):
+        return orjson.dumps([public_fields(model, row) for row in data])
+    return orjson.dumps(public_fields(model, data))
+
+def public_response(model: Type[SQLModel], data: Any) -> Response:
+    """Ответ из доверенных строк в обход response_model"""
+    return Response(content=dump_public(model, data), media_type="application/json")
@@ -0,0 +1,204 @@
+"""Время запуска воркера: импорт приложения и шаги инициализации lifespan.
+
+Отсчет импорта начинается с загрузки этого модуля - первого импорта
+main.py, шаги lifespan засекаются через startup_stats.phase(...). Итог
+пишется в лог при старте, отдается на GET /internal/startup и в метрике
+app_startup_seconds.
+
+Модули, не нужные для приема первых запросов, при старте не импортируются
+(DEFERRED_IMPORTS): python-jose тянет cryptography, тексты предсказаний
+нужны только для новых предсказаний. Они загружаются при первом обращении
+или фоновой задачей сразу после старта.
+
+Профилирование запуска - время импорта по модулям и шаги lifespan
+(воркер запускается в отдельном процессе с python -X importtime):
+    cd .. && python -m backend.startup
+    cd .. && python -m backend.startup --top 40 --json startup.json
+Проверка бюджета холодного старта: python benchmarks/cold_start.py
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Начало импорта приложения: main.py импортирует этот модуль первым
+IMPORT_STARTED = time.perf_counter()
+
+logger = logging.getLogger(__name__)
+
+# Загружаются после старта воркера, а не при импорте приложения
+DEFERRED_IMPORTS = ("jose.jwt", f"{__package__}.prediction_texts")
+
+class StartupStats:
+    """Время импорта приложения и шагов инициализации воркера"""
+
+    def __init__(self):
+        self.import_seconds = 0.0
+        self.phases: Dict[str, float] = {}
+        self.deferred_imports_seconds: Optional[float] = None
+        self.ready_at: Optional[datetime] = None
+
+    def imported(self):
+        """Отметка конца импорта приложения"""
+        self.import_seconds = time.perf_counter() - IMPORT_STARTED
+
+    @contextmanager
+    def phase(self, name: str):
+        """Засечка шага инициализации"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def ready(self):
+        self.ready_at = datetime.utcnow()
+
+    @property
+    def init_seconds(self) -> float:
+        return sum(self.phases.values())
+
+    def metric_values(self) -> Dict[tuple, float]:
+        values = {("import",): self.import_seconds}
+        values.update({(name,): seconds for name, seconds in self.phases.items()})
+        if self.deferred_imports_seconds is not None:
+            values[("deferred_imports",)] = self.deferred_imports_seconds
+        return values
+
+    def snapshot(self) -> dict:
+        return {
+            "import_seconds": round(self.import_seconds, 6),
+            "init_seconds": round(self.init_seconds, 6),
+            "total_seconds": round(self.import_seconds + self.init_seconds, 6),
+            "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            "deferred_imports_seconds": (
+                round(self.deferred_imports_seconds, 6) if self.deferred_imports_seconds is not None else None
+            ),
+            "ready_at": self.ready_at.isoformat() if self.ready_at else None
+        }
+
+    def format(self) -> str:
+        phases = ", ".join(f"{name} {seconds * 1000:.1f}" for name, seconds in self.phases.items())
+        return (
+            f"import {self.import_seconds * 1000:.1f} ms, "
+            f"init {self.init_seconds * 1000:.1f} ms ({phases})"
+        )
+
+startup_stats = StartupStats()
+
+def import_deferred_modules() -> float:
+    """Импорт отложенных модулей, возвращает затраченное время"""
+    started = time.perf_counter()
+    for name in DEFERRED_IMPORTS:
+        importlib.import_module(name)
+    return time.perf_counter() - started
+
+async def run_deferred_imports():
+    """Фоновая загрузка отложенных модулей после старта воркера.
+
+    Импорт идет в отдельном потоке: цикл событий в это время принимает
+    запросы. Запрос, которому модуль нужен раньше, импортирует его сам.
+    """
+    try:
+        startup_stats.deferred_imports_seconds = await asyncio.to_thread(import_deferred_modules)
+    except Exception as e:
+        logger.error(f"Error importing deferred modules: {e}")
+
+# === ПРОФИЛИРОВАНИЕ ===
+async def measure_startup() -> dict:
+    """Импорт приложения и старт lifespan в текущем процессе; снимок времени запуска"""
+    from .main import app
+
+    async with app.router.lifespan_context(app):
+        snapshot = startup_stats.snapshot()
+        # Отложенные модули, загруженные до готовности воркера - регрессия холодного старта
+        snapshot["deferred_loaded_at_ready"] = [name for name in DEFERRED_IMPORTS if name in sys.modules]
+        snapshot["modules_at_ready"] = len(sys.modules)
+    return snapshot
+
+PROBE = (
+    "import asyncio, json; "
+    f"from {__package__}.startup import measure_startup; "
+    "print(json.dumps(asyncio.run(measure_startup())), flush=True)"
+)
+
+def parse_importtime(output: str) -> List[dict]:
+    """Строки python -X importtime: модуль, собственное и суммарное время в секундах"""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            "self_seconds": int(self_us) / 1e6,
+            "cumulative_seconds": int(cumulative_us) / 1e6
+        })
+    return modules
+
+def group_by_package(modules: List[dict]) -> Dict[str, float]:
+    """Собственное время импорта по пакетам; модули приложения - по отдельности"""
+    groups: Dict[str, float] = {}
+    for module in modules:
+        name = module["module"]
+        key = name if name.startswith(f"{__package__}.") else name.split(".")[0]
+        groups[key] = groups.get(key, 0.0) + module["self_seconds"]
+    return dict(sorted(groups.items(), key=lambda item: item[1], reverse=True))
+
+def profile_startup() -> dict:
+    """Запуск воркера в отдельном процессе с -X importtime"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=root, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "startup failed")
+    modules = parse_importtime(result.stderr)
+    return {
+        "startup": json.loads(result.stdout.strip().splitlines()[-1]),
+        "packages": group_by_package(modules),
+        "modules": modules
+    }
+
+def print_profile(profile: dict, top: int):
+    startup = profile["startup"]
+    print(f"Import of the application: {startup['import_seconds'] * 1000:.1f} ms "
+          f"(python -X importtime inflates it), modules at ready: {startup['modules_at_ready']}")
+    print(f"\n{'package / app module':<40} {'self ms':>9}")
+    for name, seconds in list(profile["packages"].items())[:top]:
+        print(f"{name:<40} {seconds * 1000:>9.1f}")
+
+    print(f"\n{'module':<60} {'self ms':>9} {'total ms':>9}")
+    heaviest = sorted(profile["modules"], key=lambda module: module["self_seconds"], reverse=True)
+    for module in heaviest[:top]:
+        print(f"{module['module']:<60} {module['self_seconds'] * 1000:>9.1f} "
+              f"{module['cumulative_seconds'] * 1000:>9.1f}")
+
+    print(f"\n{'lifespan phase':<40} {'ms':>9}")
+    for name, seconds in startup["phases"].items():
+        print(f"{name:<40} {seconds * 1000:>9.1f}")
+    print(f"{'total init':<40} {startup['init_seconds'] * 1000:>9.1f}")
+    if startup["deferred_loaded_at_ready"]:
+        print(f"\nDeferred modules loaded before ready: {', '.join(startup['deferred_loaded_at_ready'])}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Профилирование запуска воркера")
+    parser.add_argument("--top", type=int, default=25, help="строк в таблицах")
+    parser.add_argument("--json", help="сохранить профиль в JSON")
+    args = parser.parse_args()
+
+    profile = profile_startup()
+    print_profile(profile, args.top)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False, indent=2)
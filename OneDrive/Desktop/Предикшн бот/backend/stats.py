@@ -0,0 +1,235 @@
+"""Статистика пользователей и сервиса на агрегатных таблицах.
+
+Агрегаты обновляются в транзакциях создания пользователя и подтверждения
+платежа, поэтому чтение статистики - это чтение одной-двух строк.
+Пересборка из истории:
+    python -m backend.stats
+"""
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import case, delete, func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .database import async_engine
+from .models import (
+    User, Prediction, Payment, PaymentStatus,
+    UserStats, GlobalStats,
+    UserStatsRollup, DailyStatsRollup, GlobalStatsRollup
+)
+
+# Сколько строк пересборки накапливается перед записью
+BACKFILL_BATCH_SIZE = 1000
+
+_UPSERT_INSERTS = {
+    "postgresql": pg_insert,
+    "sqlite": sqlite_insert,
+}
+
+async def _increment(session: AsyncSession, model: type[SQLModel], key: dict, **amounts: int):
+    """Атомарное увеличение счетчиков строки, строка создается при отсутствии"""
+    table = model.__table__
+    insert = _UPSERT_INSERTS.get(session.bind.dialect.name)
+    if insert is not None:
+        statement = insert(table).values(**key, **amounts).on_conflict_do_update(
+            index_elements=list(key),
+            set_={name: table.c[name] + value for name, value in amounts.items()}
+        )
+        await session.exec(statement)
+        return
+
+    # Другие СУБД: UPDATE, а если строки еще нет - INSERT
+    statement = update(table).values(
+        {name: table.c[name] + value for name, value in amounts.items()}
+    )
+    for name, value in key.items():
+        statement = statement.where(table.c[name] == value)
+    result = await session.exec(statement)
+    if result.rowcount == 0:
+        session.add(model(**key, **amounts))
+
+async def record_user_created(session: AsyncSession):
+    """Учет нового пользователя; коммит делает вызывающий код"""
+    await _increment(session, GlobalStatsRollup, {"id": 1}, total_users=1)
+
+async def record_prediction(session: AsyncSession, user_id: str, day: date, amount: int):
+    """Учет купленного предсказания; коммит делает вызывающий код.
+
+    Строка пользователя меняется одним upsert'ом, серия дней считается в нем
+    же по текущей строке: параллельные подтверждения одного пользователя
+    (например, до и после полуночи) не теряют обновлений.
+    """
+    await _record_user_prediction(session, user_id, day, amount)
+    await _increment(session, DailyStatsRollup, {"day": day}, predictions=1, revenue=amount)
+    await _increment(
+        session, GlobalStatsRollup, {"id": 1}, total_predictions=1, total_revenue=amount
+    )
+
+async def _record_user_prediction(session: AsyncSession, user_id: str, day: date, amount: int):
+    table = UserStatsRollup.__table__
+    insert = _UPSERT_INSERTS.get(session.bind.dialect.name)
+    if insert is None:
+        # Другие СУБД: строка пользователя блокируется на чтение до конца транзакции
+        stats = await session.get(UserStatsRollup, user_id, with_for_update=True)
+        if stats is None:
+            stats = UserStatsRollup(user_id=user_id)
+        _advance_streak(stats, day)
+        stats.total_predictions += 1
+        stats.total_spent += amount
+        session.add(stats)
+        return
+
+    # То же, что _advance_streak, но по значениям строки в момент обновления
+    streak = case(
+        (table.c.last_prediction_date == day, table.c.current_streak),
+        (table.c.last_prediction_date == day - timedelta(days=1), table.c.current_streak + 1),
+        else_=1
+    )
+    statement = insert(table).values(
+        user_id=user_id, total_predictions=1, total_spent=amount,
+        current_streak=1, longest_streak=1, last_prediction_date=day
+    ).on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "total_predictions": table.c.total_predictions + 1,
+            "total_spent": table.c.total_spent + amount,
+            "current_streak": streak,
+            "longest_streak": case(
+                (streak > table.c.longest_streak, streak), else_=table.c.longest_streak
+            ),
+            "last_prediction_date": day
+        }
+    )
+    await session.exec(statement)
+
+def _advance_streak(stats: UserStatsRollup, day: date):
+    """Продление серии дней подряд с предсказанием"""
+    if stats.last_prediction_date == day:
+        return
+    if stats.last_prediction_date == day - timedelta(days=1):
+        stats.current_streak += 1
+    else:
+        stats.current_streak = 1
+    stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+    stats.last_prediction_date = day
+
+async def get_user_stats(user_id: str, session: AsyncSession) -> UserStats:
+    """Статистика пользователя из агрегатов"""
+    stats = await session.get(UserStatsRollup, user_id)
+    if stats is None:
+        return UserStats(
+            user_id=user_id, total_predictions=0, current_streak=0,
+            longest_streak=0, total_spent=0
+        )
+
+    current_streak = stats.current_streak
+    # Серия прервана, если вчера предсказания не было
+    yesterday = datetime.utcnow().date() - timedelta(days=1)
+    if stats.last_prediction_date is None or stats.last_prediction_date < yesterday:
+        current_streak = 0
+
+    return UserStats(
+        user_id=user_id,
+        total_predictions=stats.total_predictions,
+        current_streak=current_streak,
+        longest_streak=stats.longest_streak,
+        total_spent=stats.total_spent,
+        last_prediction_date=stats.last_prediction_date
+    )
+
+async def get_global_stats(session: AsyncSession) -> GlobalStats:
+    """Статистика сервиса из агрегатов"""
+    totals = await session.get(GlobalStatsRollup, 1)
+    today = await session.get(DailyStatsRollup, datetime.utcnow().date())
+    return GlobalStats(
+        total_users=totals.total_users if totals else 0,
+        total_predictions=totals.total_predictions if totals else 0,
+        predictions_today=today.predictions if today else 0,
+        total_revenue=totals.total_revenue if totals else 0
+    )
+
+def _as_date(value) -> date:
+    # SQLite возвращает date() строкой
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+async def backfill_stats():
+    """Пересборка агрегатов из истории предсказаний и платежей.
+
+    Предсказания читаются одним потоком, упорядоченным по пользователю
+    и дате, так что в памяти держится серия одного пользователя и счетчики
+    по дням. Выручка агрегируется на стороне БД.
+    """
+    async with AsyncSession(async_engine) as session:
+        for model in (UserStatsRollup, DailyStatsRollup, GlobalStatsRollup):
+            await session.exec(delete(model))
+
+        completed = Payment.status == PaymentStatus.COMPLETED
+        spent_result = await session.exec(
+            select(Payment.user_id, func.sum(Payment.amount))
+            .where(completed)
+            .group_by(Payment.user_id)
+        )
+        spent: Dict[str, int] = dict(spent_result.all())
+
+        paid_day = func.date(Payment.updated_at)
+        revenue_result = await session.exec(
+            select(paid_day, func.sum(Payment.amount)).where(completed).group_by(paid_day)
+        )
+        daily: Dict[date, DailyStatsRollup] = {
+            _as_date(day): DailyStatsRollup(day=_as_date(day), revenue=revenue)
+            for day, revenue in revenue_result.all() if day is not None
+        }
+
+        total_predictions = 0
+        current: Optional[UserStatsRollup] = None
+        batch = []
+        result = await session.stream(
+            select(Prediction.user_id, Prediction.prediction_date)
+            .order_by(Prediction.user_id, Prediction.prediction_date)
+            .execution_options(yield_per=BACKFILL_BATCH_SIZE)
+        )
+        async for user_id, day in result:
+            if current is None or current.user_id != user_id:
+                current = UserStatsRollup(user_id=user_id, total_spent=spent.pop(user_id, 0))
+                batch.append(current)
+            _advance_streak(current, day)
+            current.total_predictions += 1
+            total_predictions += 1
+
+            if day not in daily:
+                daily[day] = DailyStatsRollup(day=day)
+            daily[day].predictions += 1
+
+            if len(batch) >= BACKFILL_BATCH_SIZE:
+                # Последний пользователь пачки еще может получить строки
+                session.add_all(batch[:-1])
+                await session.flush()
+                batch = batch[-1:]
+
+        session.add_all(batch)
+        # Пользователи с оплатами, но без предсказаний
+        session.add_all(
+            UserStatsRollup(user_id=user_id, total_spent=amount)
+            for user_id, amount in spent.items()
+        )
+        session.add_all(daily.values())
+
+        total_users = (await session.exec(select(func.count()).select_from(User))).one()
+        session.add(GlobalStatsRollup(
+            id=1,
+            total_users=total_users,
+            total_predictions=total_predictions,
+            total_revenue=sum(row.revenue for row in daily.values())
+        ))
+        await session.commit()
+
+if __name__ == "__main__":
+    from .migrate import verify_schema_version
+
+    verify_schema_version()
+    asyncio.run(backfill_stats())
+    print("Статистика пересобрана")
@@ -0,0 +1,78 @@
+"""Микробенчмарк стоимости аутентификации одного запроса.
+
+Запуск из корня проекта:
+    python benchmarks/auth_overhead.py --database-url sqlite:///./benchmark.db
+
+Сравнивает get_current_user без кэшей (декодирование JWT + запрос в БД),
+с кэшем токенов и пользователей и в stateless-режиме.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:///./benchmark.db")
+    parser.add_argument("--iterations", type=int, default=2000)
+    return parser.parse_args()
+
+async def measure(label: str, token: str, iterations: int, clear_caches: bool):
+    """Среднее время вызова get_current_user в микросекундах"""
+    from fastapi.security import HTTPAuthorizationCredentials
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from backend import auth
+    from backend.database import async_engine
+
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        if clear_caches:
+            auth.token_cache.clear()
+            auth.user_cache.clear()
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            await auth.get_current_user(credentials, session)
+    per_call = (time.perf_counter() - started) / iterations * 1e6
+    print(f"{label:<24} {per_call:10.1f} us/request")
+
+async def main():
+    args = parse_args()
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from sqlmodel import Session, SQLModel
+    from backend import auth
+    from backend.config import settings
+    from backend.database import engine
+    from backend.models import User, ZodiacSign
+
+    SQLModel.metadata.create_all(engine)
+    user = User(
+        id=str(uuid.uuid4()),
+        first_name="Benchmark",
+        telegram_id=int(time.time() * 1000),
+        zodiac_sign=ZodiacSign.LEO,
+        created_at=datetime.utcnow()
+    )
+    with Session(engine) as session:
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+
+    settings.auth_stateless_tokens = False
+    token = auth.create_user_access_token(user)
+    await measure("db lookup, no cache", token, args.iterations, clear_caches=True)
+    await measure("token + user cache", token, args.iterations, clear_caches=False)
+
+    settings.auth_stateless_tokens = True
+    stateless_token = auth.create_user_access_token(user)
+    await measure("stateless token", stateless_token, args.iterations, clear_caches=False)
+
+if __name__ == "__main__":
+    asyncio.run(main())
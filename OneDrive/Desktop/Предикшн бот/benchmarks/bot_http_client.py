@@ -0,0 +1,99 @@
+"""Бенчмарк вызовов backend из бота: новый клиент на вызов против общего.
+
+Запуск из корня проекта:
+    python benchmarks/bot_http_client.py --calls 2000 --concurrency 20
+
+Поднимает локальный заглушечный backend (HTTP/1.1 с keep-alive) и
+сравнивает прежнюю схему `async with httpx.AsyncClient()` на каждый
+вызов с общим клиентом из telegram-bot/main.py.
+"""
+import argparse
+import asyncio
+import importlib.util
+import logging
+import os
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+RESPONSE_BODY = b'{"can_purchase": true}'
+RESPONSE = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: " + str(len(RESPONSE_BODY)).encode() + b"\r\n"
+    b"Connection: keep-alive\r\n\r\n" + RESPONSE_BODY
+)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    return parser.parse_args()
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Заглушка backend: отвечает одним и тем же JSON на любой запрос"""
+    try:
+        while True:
+            headers = await reader.readuntil(b"\r\n\r\n")
+            for line in headers.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    await reader.readexactly(int(line.split(b":")[1]))
+            writer.write(RESPONSE)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+def load_bot_module():
+    """Импорт telegram-bot/main.py (в имени папки есть дефис)"""
+    spec = importlib.util.spec_from_file_location("prediction_bot", ROOT / "telegram-bot" / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+async def run_calls(call, total: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await call()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return total / (time.perf_counter() - started)
+
+async def main():
+    import httpx
+
+    args = parse_args()
+    base_url = f"http://127.0.0.1:{args.port}"
+    os.environ["API_BASE_URL"] = base_url
+    bot_module = load_bot_module()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    server = await asyncio.start_server(handle_connection, "127.0.0.1", args.port)
+    async with server:
+        async def client_per_call():
+            async with httpx.AsyncClient() as client:
+                response = await client.get(f"{base_url}/predictions/can-purchase")
+                response.raise_for_status()
+
+        shared = bot_module.create_api_client()
+
+        async def shared_client():
+            response = await shared.get("/predictions/can-purchase")
+            response.raise_for_status()
+
+        before = await run_calls(client_per_call, args.calls, args.concurrency)
+        after = await run_calls(shared_client, args.calls, args.concurrency)
+        await shared.aclose()
+
+    print(f"calls: {args.calls}, concurrency: {args.concurrency}")
+    print(f"client per call {before:10.1f} calls/s")
+    print(f"shared client   {after:10.1f} calls/s  (x{after / before:.2f})")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,259 @@
+"""Пропускная способность обработчиков бота против заглушки Telegram.
+
+Запуск из корня проекта:
+    python benchmarks/bot_load.py --users 500 --concurrency 50
+    python benchmarks/bot_load.py --save before.json
+    python benchmarks/bot_load.py --compare before.json
+
+Каждый виртуальный пользователь проходит сценарий бота: /start, кнопка
+«Получить предсказание» (покупка и инвойс), pre_checkout_query, успешный
+платеж (подтверждение и предсказание), /profile и /rankings. Обновления
+идут через планировщик бота, как в webhook-режиме; задержка операции -
+время обработки обновления, включая вызовы backend и Bot API.
+
+Bot API - заглушка на uvicorn без лимитов, которая отвечает на все методы
+и запоминает payload инвойсов. Backend работает в процессе на данных из
+seed.py, без ограничения частоты запросов.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from itertools import count
+from pathlib import Path
+from urllib.parse import parse_qs
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "telegram-bot"))
+
+from latency import LatencyRecorder, print_comparison
+from seed import add_seed_args, seed
+
+INTERNAL_TOKEN = "benchmark"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:///./benchmark.db")
+    add_seed_args(parser)
+    parser.add_argument("--concurrency", type=int, default=50, help="пользователей одновременно")
+    parser.add_argument("--port", type=int, default=8183)
+    parser.add_argument("--save", help="сохранить результаты в JSON")
+    parser.add_argument("--compare", help="сравнить с сохраненными результатами")
+    return parser.parse_args()
+
+class StubBotAPI:
+    """ASGI-заглушка Bot API: успешный ответ на любой метод"""
+
+    def __init__(self):
+        self.calls = 0
+        self.invoices = {}
+        self.predictions_delivered = 0
+        self.error_replies = Counter()
+        self._message_ids = count(1)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                else:
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        content_type = dict(scope["headers"]).get(b"content-type", b"")
+        if content_type.startswith(b"application/json"):
+            params = json.loads(body or b"{}")
+        else:
+            params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        payload = {"ok": True, "result": self.handle(scope["path"].rsplit("/", 1)[-1], params)}
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")]
+        })
+        await send({"type": "http.response.body", "body": json.dumps(payload).encode()})
+
+    def handle(self, method: str, params: dict):
+        self.calls += 1
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Bot", "username": "benchmark_bot"}
+        if method in ("sendMessage", "sendInvoice"):
+            chat_id = int(params["chat_id"])
+            if method == "sendInvoice":
+                self.invoices[chat_id] = params["payload"]
+            elif "Ваше предсказание" in params.get("text", ""):
+                self.predictions_delivered += 1
+            elif params.get("text", "").startswith("❌"):
+                # Обработчики не пробрасывают ошибки backend, а отвечают пользователю
+                self.error_replies[chat_id] += 1
+            return {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", "")
+            }
+        return True
+
+class UpdateFactory:
+    """JSON обновлений Telegram для сценария пользователя"""
+
+    def __init__(self):
+        self._ids = count(1)
+
+    def _user(self, telegram_id: int) -> dict:
+        return {"id": telegram_id, "is_bot": False, "first_name": f"User {telegram_id}"}
+
+    def _message(self, telegram_id: int, **fields) -> dict:
+        return {
+            "update_id": next(self._ids),
+            "message": {
+                "message_id": next(self._ids),
+                "date": int(time.time()),
+                "chat": {"id": telegram_id, "type": "private"},
+                "from": self._user(telegram_id),
+                **fields
+            }
+        }
+
+    def command(self, telegram_id: int, command: str) -> dict:
+        return self._message(telegram_id, text=command, entities=[
+            {"type": "bot_command", "offset": 0, "length": len(command)}
+        ])
+
+    def callback(self, telegram_id: int, data: str) -> dict:
+        return {
+            "update_id": next(self._ids),
+            "callback_query": {
+                "id": str(next(self._ids)),
+                "from": self._user(telegram_id),
+                "chat_instance": str(telegram_id),
+                "data": data,
+                "message": {
+                    "message_id": next(self._ids),
+                    "date": int(time.time()),
+                    "chat": {"id": telegram_id, "type": "private"},
+                    "text": "menu"
+                }
+            }
+        }
+
+    def pre_checkout(self, telegram_id: int, payload: str) -> dict:
+        return {
+            "update_id": next(self._ids),
+            "pre_checkout_query": {
+                "id": str(next(self._ids)),
+                "from": self._user(telegram_id),
+                "currency": "XTR",
+                "total_amount": 1,
+                "invoice_payload": payload
+            }
+        }
+
+    def successful_payment(self, telegram_id: int, payload: str) -> dict:
+        return self._message(telegram_id, successful_payment={
+            "currency": "XTR",
+            "total_amount": 1,
+            "invoice_payload": payload,
+            "telegram_payment_charge_id": f"bench-{telegram_id}-{next(self._ids)}",
+            "provider_payment_charge_id": ""
+        })
+
+async def main():
+    args = parse_args()
+    os.environ.update(
+        DATABASE_URL=args.database_url,
+        INTERNAL_API_TOKEN=INTERNAL_TOKEN,
+        RATE_LIMIT_ENABLED="false",
+        TELEGRAM_BOT_TOKEN="123456:benchmark",
+        TELEGRAM_API_BASE_URL=f"http://127.0.0.1:{args.port}/bot",
+        BOT_STATS_LOG_INTERVAL="0"
+    )
+
+    import httpx
+    import uvicorn
+    from telegram import Update
+
+    users = await seed(args.users, args.days, args.activity, args.seed)
+    from backend.main import app as backend_app
+    from main import PredictionBot
+    logging.getLogger().setLevel(logging.WARNING)
+
+    stub = StubBotAPI()
+    factory = UpdateFactory()
+    recorder = LatencyRecorder()
+
+    async with backend_app.router.lifespan_context(backend_app):
+        server = uvicorn.Server(uvicorn.Config(stub, port=args.port, log_level="warning"))
+        server_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+
+        prediction_bot = PredictionBot()
+        prediction_bot.api = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=backend_app),
+            base_url="http://backend",
+            headers={"X-Internal-Token": INTERNAL_TOKEN}
+        )
+        application = prediction_bot.application
+        await application.initialize()
+
+        async def process(name: str, data: dict):
+            update = Update.de_json(data, application.bot)
+            chat_id = update.effective_user.id
+            error_replies = stub.error_replies[chat_id]
+            started = time.perf_counter()
+            try:
+                await application.update_processor.process_update(update, application.process_update(update))
+                ok = stub.error_replies[chat_id] == error_replies
+            except Exception:
+                ok = False
+            recorder.record(name, time.perf_counter() - started, ok=ok)
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def scenario(telegram_id: int):
+            async with semaphore:
+                await process("/start", factory.command(telegram_id, "/start"))
+                await process("get_prediction", factory.callback(telegram_id, "get_prediction"))
+                payload = stub.invoices.get(telegram_id)
+                if payload is None:
+                    recorder.record("invoice missing", 0.0, ok=False)
+                else:
+                    await process("pre_checkout_query", factory.pre_checkout(telegram_id, payload))
+                    await process("successful_payment", factory.successful_payment(telegram_id, payload))
+                await process("/profile", factory.command(telegram_id, "/profile"))
+                await process("/rankings", factory.command(telegram_id, "/rankings"))
+
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*(scenario(user.telegram_id) for user in users))
+            elapsed = time.perf_counter() - started
+        finally:
+            await application.shutdown()
+            await prediction_bot.api.aclose()
+            server.should_exit = True
+            await server_task
+
+    print(f"database: {args.database_url}, users: {len(users)}, concurrency: {args.concurrency}")
+    print(f"updates: {sum(len(values) for values in recorder.latencies.values())} in {elapsed:.1f}s, "
+          f"Bot API calls: {stub.calls}, predictions delivered: {stub.predictions_delivered}/{len(users)}, "
+          f"error replies: {sum(stub.error_replies.values())}")
+    recorder.print_report(elapsed)
+    if args.save:
+        recorder.save(args.save, elapsed, vars(args))
+    if args.compare:
+        print_comparison(args.compare, recorder.summary(elapsed))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,238 @@
+"""Прогон ежедневной рассылки против локального заглушечного Bot API.
+
+Запуск из корня проекта:
+    python benchmarks/broadcast.py --users 300 --rate 25
+
+Поднимает заглушку Bot API с лимитами Telegram (общий лимит в секунду,
+не чаще одного сообщения в чат в секунду, 429 с retry_after при
+превышении, 403 для части чатов), backend на временной SQLite и
+запускает рассылку из telegram-bot/broadcast.py. Рассылка прерывается
+на середине и продолжается с сохраненного прогресса; в конце
+проверяется, что каждый подписчик получил сообщение.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+from pathlib import Path
+from urllib.parse import parse_qs
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "telegram-bot"))
+
+INTERNAL_TOKEN = "benchmark"
+ZODIAC_SIGNS = [
+    "aries", "taurus", "gemini", "cancer", "leo", "virgo",
+    "libra", "scorpio", "sagittarius", "capricorn", "aquarius", "pisces"
+]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--subscribed-share", type=float, default=0.8)
+    parser.add_argument("--blocked-every", type=int, default=10, help="каждый N-й подписчик заблокировал бота")
+    parser.add_argument("--rate", type=float, default=25, help="лимит рассылки, сообщений в секунду")
+    parser.add_argument("--api-limit", type=int, default=30, help="лимит заглушки Bot API в секунду")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--interrupt-at", type=float, default=0.5, help="доля отправок до прерывания")
+    parser.add_argument("--port", type=int, default=8182)
+    return parser.parse_args()
+
+class FakeBotAPI:
+    """ASGI-заглушка Bot API: getMe и sendMessage с лимитами Telegram"""
+
+    def __init__(self, global_limit: int, blocked: set):
+        self.global_limit = global_limit
+        self.blocked = blocked
+        self.delivered = Counter()
+        self.rejected_429 = 0
+        self.rejected_403 = 0
+        self.peak_per_second = 0
+        self._recent = deque()
+        self._last_per_chat = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                else:
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        method = scope["path"].rsplit("/", 1)[-1]
+        status, payload = self.handle(method, self.parse_params(scope, body))
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")]
+        })
+        await send({"type": "http.response.body", "body": json.dumps(payload).encode()})
+
+    @staticmethod
+    def parse_params(scope, body: bytes) -> dict:
+        content_type = dict(scope["headers"]).get(b"content-type", b"")
+        if content_type.startswith(b"application/json"):
+            return json.loads(body or b"{}")
+        return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+
+    def handle(self, method: str, params: dict):
+        if method == "getMe":
+            return 200, {"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "Bot", "username": "benchmark_bot"
+            }}
+        if method != "sendMessage":
+            return 200, {"ok": True, "result": True}
+
+        chat_id = int(params["chat_id"])
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= 1:
+            self._recent.popleft()
+        last = self._last_per_chat.get(chat_id)
+        if len(self._recent) >= self.global_limit or (last is not None and now - last < 1):
+            self.rejected_429 += 1
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1}
+            }
+        if chat_id in self.blocked:
+            self.rejected_403 += 1
+            return 403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+
+        self._recent.append(now)
+        self._last_per_chat[chat_id] = now
+        self.peak_per_second = max(self.peak_per_second, len(self._recent))
+        self.delivered[chat_id] += 1
+        return 200, {"ok": True, "result": {
+            "message_id": sum(self.delivered.values()),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", "")
+        }}
+
+async def seed_users(api, args) -> tuple:
+    """Пользователи с подпиской и без; возвращает (подписчики, заблокировавшие)"""
+    subscribed, blocked = set(), set()
+    for i in range(args.users):
+        telegram_id = 100000 + i
+        # Подписчики равномерно распределены по доле subscribed_share
+        daily_push = int((i + 1) * args.subscribed_share) > int(i * args.subscribed_share)
+        response = await api.post("/users/", json={
+            "telegram_id": telegram_id,
+            "first_name": f"User {i}",
+            "zodiac_sign": ZODIAC_SIGNS[i % len(ZODIAC_SIGNS)],
+            "daily_push": daily_push
+        })
+        response.raise_for_status()
+        if daily_push:
+            subscribed.add(telegram_id)
+            if args.blocked_every and len(subscribed) % args.blocked_every == 0:
+                blocked.add(telegram_id)
+    return subscribed, blocked
+
+async def main():
+    args = parse_args()
+    workdir = Path(tempfile.mkdtemp(prefix="broadcast-"))
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{workdir / 'broadcast.db'}",
+        INTERNAL_API_TOKEN=INTERNAL_TOKEN,
+        PAYMENT_WORKER_INTERVAL_SECONDS="0",
+        TELEGRAM_BOT_TOKEN="123456:benchmark",
+        TELEGRAM_API_BASE_URL=f"http://127.0.0.1:{args.port}/bot",
+        BROADCAST_LOG_INTERVAL="0"
+    )
+    logging.basicConfig(level=logging.WARNING)
+
+    import httpx
+    import uvicorn
+    from backend.main import app as backend_app
+    from backend.migrate import upgrade
+    from broadcast import Broadcaster, BroadcastLimiter
+    from main import PredictionBot
+
+    upgrade()
+
+    checkpoint_path = str(workdir / "checkpoint.json")
+    async with backend_app.router.lifespan_context(backend_app):
+        api = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=backend_app),
+            base_url="http://backend",
+            headers={"X-Internal-Token": INTERNAL_TOKEN}
+        )
+        subscribed, blocked = await seed_users(api, args)
+        fake = FakeBotAPI(args.api_limit, blocked)
+        server = uvicorn.Server(uvicorn.Config(fake, port=args.port, log_level="warning"))
+        server_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+
+        prediction_bot = PredictionBot()
+        prediction_bot.api = api
+        await prediction_bot.application.initialize()
+
+        def make_broadcaster():
+            return Broadcaster(
+                prediction_bot,
+                checkpoint_path=checkpoint_path,
+                batch_size=args.batch_size,
+                limiter=BroadcastLimiter(args.rate, 1.0)
+            )
+
+        try:
+            # Первый запуск прерывается после части отправок
+            first = make_broadcaster()
+            interrupt_after = int(len(subscribed) * args.interrupt_at)
+            run_task = asyncio.create_task(first.run(reset=True))
+            while not run_task.done() and sum(fake.delivered.values()) < interrupt_after:
+                await asyncio.sleep(0.01)
+            run_task.cancel()
+            await asyncio.gather(run_task, return_exceptions=True)
+            interrupted = first.stats.snapshot()
+            with open(checkpoint_path, encoding="utf-8") as f:
+                checkpoint = json.load(f)
+
+            started = time.perf_counter()
+            resumed = await make_broadcaster().run()
+            elapsed = time.perf_counter() - started
+        finally:
+            await prediction_bot.application.shutdown()
+            await api.aclose()
+            server.should_exit = True
+            await server_task
+
+    expected = subscribed - blocked
+    missing = expected - set(fake.delivered)
+    unexpected = set(fake.delivered) - expected
+    duplicates = sum(count - 1 for count in fake.delivered.values() if count > 1)
+
+    print(f"Subscribers: {len(subscribed)} ({len(blocked)} blocked the bot), users total: {args.users}")
+    print(f"Interrupted run: {interrupted}")
+    print(f"Checkpoint after interruption: sent={checkpoint['sent']} after_sign={checkpoint['after_sign']}")
+    print(f"Resumed run: {resumed}")
+    print(f"Resumed run wall time: {elapsed:.1f}s")
+    print(f"Bot API: delivered={sum(fake.delivered.values())} 429={fake.rejected_429} "
+          f"403={fake.rejected_403} peak={fake.peak_per_second}/s (limit {args.api_limit}/s)")
+    print(f"Missing: {len(missing)}, unexpected: {len(unexpected)}, "
+          f"duplicates (interrupted batch resent): {duplicates} (at most {args.batch_size})")
+
+    assert not missing, f"Not delivered: {sorted(missing)[:10]}"
+    assert not unexpected, f"Delivered to non-subscribers: {sorted(unexpected)[:10]}"
+    assert duplicates <= args.batch_size
+    assert fake.peak_per_second <= args.api_limit
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""Сбор задержек по операциям и отчет p50/p95/p99 и пропускной способности"""
+import json
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+def percentile(sorted_values: List[float], share: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(share * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class LatencyRecorder:
+    """Задержки в секундах по имени операции; ошибки считаются отдельно"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name: str, seconds: float, ok: bool = True, status: Optional[str] = None):
+        self.latencies[name].append(seconds)
+        if not ok:
+            self.errors[name] += 1
+        if status is not None:
+            self.statuses[name][status] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        """Метрики по операциям и итог; задержки в миллисекундах"""
+        result = {}
+        names = sorted(self.latencies)
+        for name in names + ["TOTAL"]:
+            values = sorted(
+                self.latencies[name] if name != "TOTAL"
+                else [value for name in names for value in self.latencies[name]]
+            )
+            if not values:
+                continue
+            result[name] = {
+                "count": len(values),
+                "errors": self.errors[name] if name != "TOTAL" else sum(self.errors.values()),
+                "throughput_rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+                "statuses": dict(self.statuses[name]) if name != "TOTAL" else {}
+            }
+        return result
+
+    def print_report(self, elapsed: float):
+        summary = self.summary(elapsed)
+        width = max([len(name) for name in summary] + [9])
+        print(f"{'operation':<{width}} {'count':>7} {'errors':>6} {'rps':>8} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}  statuses")
+        for name, row in summary.items():
+            statuses = " ".join(f"{status}:{count}" for status, count in sorted(row["statuses"].items()))
+            print(f"{name:<{width}} {row['count']:>7} {row['errors']:>6} {row['throughput_rps']:>8} "
+                  f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}  {statuses}")
+
+    def save(self, path: str, elapsed: float, params: dict):
+        """Результаты в JSON для сравнения прогонов до и после изменения"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"params": params, "elapsed_seconds": round(elapsed, 3),
+                       "operations": self.summary(elapsed)}, f, ensure_ascii=False, indent=2)
+
+def print_comparison(baseline_path: str, summary: Dict[str, dict]):
+    """Изменение перцентилей и пропускной способности относительно сохраненного прогона"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["operations"]
+    print(f"\nChange vs {baseline_path} (negative latency change is better)")
+    for name, row in summary.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            delta = (row[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            changes.append(f"{key} {before[key]} -> {row[key]} ({delta:+.1f}%)")
+        print(f"  {name}: " + ", ".join(changes))
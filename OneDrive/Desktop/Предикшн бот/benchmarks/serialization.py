@@ -0,0 +1,102 @@
+"""Микробенчмарк сериализации ответов со списками строк.
+
+Запуск из корня проекта:
+    python benchmarks/serialization.py --rows 100
+
+Сравнивает стоимость сериализации одной строки UserPublic и PredictionPublic:
+стандартный путь FastAPI (response_model + jsonable_encoder + json),
+тот же путь с ORJSONResponse и прямую сериализацию полей через orjson.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=200)
+    return parser.parse_args()
+
+def make_users(count: int):
+    from backend.models import User, ZodiacSign
+
+    return [
+        User(
+            id=str(uuid.uuid4()),
+            first_name=f"User {i}",
+            telegram_id=i,
+            zodiac_sign=ZodiacSign.LEO,
+            predictions_count=i,
+            created_at=datetime.utcnow()
+        )
+        for i in range(count)
+    ]
+
+def make_predictions(count: int):
+    from backend.models import Prediction, ZodiacSign
+
+    return [
+        Prediction(
+            id=str(uuid.uuid4()),
+            user_id="user",
+            zodiac_sign=ZodiacSign.LEO,
+            prediction_text="Сегодня вы будете в центре внимания! Используйте это с умом.",
+            prediction_date=date.today(),
+            created_at=datetime.utcnow()
+        )
+        for _ in range(count)
+    ]
+
+async def measure(label: str, render, rows: list, iterations: int):
+    """Среднее время сериализации одной строки в микросекундах"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await render(rows)
+    per_row = (time.perf_counter() - started) / iterations / len(rows) * 1e6
+    print(f"  {label:<28} {per_row:8.2f} us/row")
+
+async def compare(title: str, model, rows: list, iterations: int):
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    from backend.serialization import dump_public
+
+    field = create_response_field(name="response", type_=List[model])
+
+    async def fastapi_default(items):
+        content = await serialize_response(field=field, response_content=items, is_coroutine=True)
+        return JSONResponse(content).body
+
+    async def fastapi_orjson(items):
+        content = await serialize_response(field=field, response_content=items, is_coroutine=True)
+        return ORJSONResponse(content).body
+
+    async def direct_orjson(items):
+        return dump_public(model, items)
+
+    # Ответы должны совпадать по содержимому
+    assert json.loads(await fastapi_default(rows)) == json.loads(await direct_orjson(rows))
+
+    print(f"{title} ({len(rows)} rows per response)")
+    await measure("response_model + json", fastapi_default, rows, iterations)
+    await measure("response_model + orjson", fastapi_orjson, rows, iterations)
+    await measure("fields + orjson", direct_orjson, rows, iterations)
+
+async def main():
+    args = parse_args()
+    from backend.models import UserPublic, PredictionPublic
+
+    await compare("UserPublic", UserPublic, make_users(args.rows), args.iterations)
+    await compare("PredictionPublic", PredictionPublic, make_predictions(args.rows), args.iterations)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,15 +1,35 @@
 import React from 'react';
-import { useQuery } from 'react-query';
+import { useInfiniteQuery } from 'react-query';
 import { History as HistoryIcon, Calendar, Sparkles } from 'lucide-react';
 
 import { predictionAPI } from '../services/api';
+import { useAuth } from '../contexts/AuthContext';
 import LoadingSpinner from '../components/LoadingSpinner';
 import PredictionCard from '../components/PredictionCard';
 
+const PAGE_SIZE = 50;
+
 const History = () => {
-  const { data: predictions, isLoading, error } = useQuery(
+  const { user } = useAuth();
+  const {
+    data,
+    isLoading,
+    error,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage
+  } = useInfiniteQuery(
     'userPredictions',
-    predictionAPI.getUserPredictions
+    ({ pageParam }) => predictionAPI.getUserPredictions({ limit: PAGE_SIZE, ...pageParam }),
+    {
+      // Курсор следующей страницы - последнее предсказание текущей
+      getNextPageParam: (lastPage) => {
+        const page = lastPage.data;
+        if (page.length < PAGE_SIZE) return undefined;
+        const last = page[page.length - 1];
+        return { after_created_at: last.created_at, after_id: last.id };
+      },
+    }
   );
 
   if (isLoading) {
@@ -24,7 +44,8 @@ const History = () => {
     );
   }
 
-  const userPredictions = predictions?.data || [];
+  const userPredictions = data?.pages.flatMap((page) => page.data) || [];
+  const totalPredictions = user?.predictions_count ?? userPredictions.length;
 
   return (
     <div className="max-w-4xl mx-auto space-y-8">
@@ -43,13 +64,13 @@ const History = () => {
       <div className="grid md:grid-cols-3 gap-6">
         <div className="card p-6 text-center">
           <div className="text-3xl mb-2">🔮</div>
-          <div className="text-2xl font-bold text-white">{userPredictions.length}</div>
+          <div className="text-2xl font-bold text-white">{totalPredictions}</div>
           <div className="text-purple-200 text-sm">Всего предсказаний</div>
         </div>
         
         <div className="card p-6 text-center">
           <div className="text-3xl mb-2">⭐</div>
-          <div className="text-2xl font-bold text-white">{userPredictions.length} XTR</div>
+          <div className="text-2xl font-bold text-white">{totalPredictions} XTR</div>
           <div className="text-purple-200 text-sm">Stars потрачено</div>
         </div>
         
@@ -75,7 +96,7 @@ const History = () => {
           
           {userPredictions.length > 0 && (
             <div className="text-sm text-purple-300">
-              Показано {userPredictions.length} предсказаний
+              Показано {userPredictions.length} из {totalPredictions} предсказаний
             </div>
           )}
         </div>
@@ -92,6 +113,18 @@ const History = () => {
                 className="hover:scale-[1.02] transition-transform duration-200"
               />
             ))}
+
+            {hasNextPage && (
+              <div className="text-center">
+                <button
+                  onClick={() => fetchNextPage()}
+                  disabled={isFetchingNextPage}
+                  className="btn-primary"
+                >
+                  {isFetchingNextPage ? 'Загрузка...' : 'Показать еще'}
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
@@ -12,7 +12,8 @@ const Profile = () => {
   const [isEditing, setIsEditing] = useState(false);
   const [editForm, setEditForm] = useState({
     first_name: user?.first_name || '',
-    zodiac_sign: user?.zodiac_sign || ''
+    zodiac_sign: user?.zodiac_sign || '',
+      daily_push: user?.daily_push || false
   });
 
   const updateProfileMutation = useMutation(userAPI.updateProfile, {
@@ -39,7 +40,8 @@ const Profile = () => {
   const handleCancel = () => {
     setEditForm({
       first_name: user?.first_name || '',
-      zodiac_sign: user?.zodiac_sign || ''
+      zodiac_sign: user?.zodiac_sign || '',
+      daily_push: user?.daily_push || false
     });
     setIsEditing(false);
   };
@@ -170,6 +172,27 @@ const Profile = () => {
               </div>
             )}
           </div>
+
+          {/* Ежедневная рассылка */}
+          <div className="space-y-2">
+            <label className="text-sm font-medium text-purple-200">
+              Ежедневное предсказание в Telegram
+            </label>
+            {isEditing ? (
+              <label className="input flex items-center space-x-2 cursor-pointer">
+                <input
+                  type="checkbox"
+                  checked={editForm.daily_push}
+                  onChange={(e) => setEditForm(prev => ({ ...prev, daily_push: e.target.checked }))}
+                />
+                <span>Присылать каждое утро</span>
+              </label>
+            ) : (
+              <div className="input bg-purple-900 bg-opacity-30">
+                {user.daily_push ? 'Включено' : 'Выключено'}
+              </div>
+            )}
+          </div>
         </div>
 
         {!user.zodiac_sign && (
@@ -26,7 +26,14 @@ apiClient.interceptors.request.use(
 
 // Интерсептор ответов
 apiClient.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    // Сервер выдал новый токен с обновленными данными пользователя
+    const token = response.headers['x-access-token'];
+    if (token) {
+      localStorage.setItem('token', token);
+    }
+    return response;
+  },
   (error) => {
     if (error.response) {
       const { status, data } = error.response;
@@ -78,7 +85,7 @@ export const userAPI = {
 
 // API методы для предсказаний
 export const predictionAPI = {
-  getUserPredictions: () => apiClient.get('/predictions/'),
+  getUserPredictions: (params = {}) => apiClient.get('/predictions/', { params }),
   getTodayPrediction: () => apiClient.get('/predictions/today'),
   canPurchase: () => apiClient.get('/predictions/can-purchase'),
 };
@@ -0,0 +1,299 @@
+"""Ежедневная рассылка предсказаний подписчикам.
+
+Подписчики читаются из backend пачками по (zodiac_sign, id), текст каждого
+знака рассчитывается один раз. Отправка ограничена token bucket'ами:
+общим лимитом Bot API и лимитом на чат. После каждой пачки прогресс
+сохраняется в файл, так что прерванная рассылка продолжается с места
+остановки.
+
+Разовый запуск:
+    python broadcast.py            # рассылка на сегодня
+    python broadcast.py --reset    # начать заново, игнорируя сохраненный прогресс
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Настройки рассылки
+BROADCAST_GLOBAL_RATE = float(os.getenv('BROADCAST_GLOBAL_RATE', '25'))  # сообщений в секунду (лимит Telegram ~30)
+BROADCAST_PER_CHAT_INTERVAL = float(os.getenv('BROADCAST_PER_CHAT_INTERVAL', '1'))  # секунд между сообщениями в чат
+BROADCAST_BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', '500'))
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '30'))
+BROADCAST_MAX_ATTEMPTS = int(os.getenv('BROADCAST_MAX_ATTEMPTS', '3'))
+BROADCAST_CHECKPOINT_PATH = os.getenv('BROADCAST_CHECKPOINT_PATH', 'broadcast_checkpoint.json')
+BROADCAST_LOG_INTERVAL = float(os.getenv('BROADCAST_LOG_INTERVAL', '30'))
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, запас не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Остановка выдачи токенов на seconds (ответ 429 от Telegram)"""
+        self.tokens = 0
+        self.updated = max(self.updated, time.monotonic() + seconds)
+
+class BroadcastLimiter:
+    """Общий лимит отправки и минимальный интервал между сообщениями в один чат"""
+
+    def __init__(self, global_rate: float, per_chat_interval: float):
+        # Запас в одну секунду: без всплесков сверх лимита Telegram
+        self.global_bucket = TokenBucket(global_rate, max(1.0, global_rate))
+        self.per_chat_interval = per_chat_interval
+        self._last_sent: "OrderedDict[int, float]" = OrderedDict()
+
+    async def acquire(self, chat_id: int):
+        last_sent = self._last_sent.get(chat_id)
+        if last_sent is not None:
+            delay = last_sent + self.per_chat_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await self.global_bucket.acquire()
+
+        now = time.monotonic()
+        self._last_sent[chat_id] = now
+        self._last_sent.move_to_end(chat_id)
+        # Чаты, которым писали дольше интервала назад, больше не ограничены
+        while self._last_sent:
+            oldest_chat, oldest_time = next(iter(self._last_sent.items()))
+            if now - oldest_time < self.per_chat_interval:
+                break
+            del self._last_sent[oldest_chat]
+
+@dataclass
+class BroadcastStats:
+    """Метрики рассылки"""
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+    retried: int = 0
+    rate_limited: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    def snapshot(self) -> dict:
+        elapsed = time.monotonic() - self.started_at
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "retried": self.retried,
+            "rate_limited": self.rate_limited,
+            "elapsed_seconds": round(elapsed, 1),
+            "messages_per_second": round(self.sent / elapsed, 1) if elapsed else 0.0
+        }
+
+@dataclass
+class BroadcastCheckpoint:
+    """Прогресс рассылки за день: курсор последней полностью отправленной пачки"""
+    day: str
+    after_sign: Optional[str] = None
+    after_id: Optional[str] = None
+    done: bool = False
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+
+    @classmethod
+    def load(cls, path: str, day: date) -> "BroadcastCheckpoint":
+        try:
+            with open(path, encoding='utf-8') as f:
+                checkpoint = cls(**json.load(f))
+        except (FileNotFoundError, TypeError, ValueError):
+            return cls(day=day.isoformat())
+        if checkpoint.day != day.isoformat():
+            return cls(day=day.isoformat())
+        return checkpoint
+
+    def save(self, path: str):
+        # Запись через временный файл: прерывание не оставит битый JSON
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(asdict(self), f)
+        os.replace(tmp_path, path)
+
+class Broadcaster:
+    """Рассылка предсказаний подписчикам через бота"""
+
+    def __init__(
+        self,
+        prediction_bot,
+        checkpoint_path: str = BROADCAST_CHECKPOINT_PATH,
+        batch_size: int = BROADCAST_BATCH_SIZE,
+        concurrency: int = BROADCAST_CONCURRENCY,
+        limiter: Optional[BroadcastLimiter] = None
+    ):
+        self.prediction_bot = prediction_bot
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.limiter = limiter or BroadcastLimiter(BROADCAST_GLOBAL_RATE, BROADCAST_PER_CHAT_INTERVAL)
+        self.stats = BroadcastStats()
+
+    async def fetch_texts(self, day: date) -> Dict[str, str]:
+        """Сообщение для каждого знака, собирается один раз"""
+        response = await self.prediction_bot.api.get("/internal/broadcast/texts", params={"day": day.isoformat()})
+        response.raise_for_status()
+        bot = self.prediction_bot
+        return {
+            sign: f"""🌅 *Предсказание на {day.strftime('%d.%m.%Y')}*
+
+{bot.get_zodiac_emoji(sign)} *{bot.get_zodiac_title(sign)}*
+
+{text}"""
+            for sign, text in response.json().items()
+        }
+
+    async def fetch_recipients(self, after_sign: Optional[str], after_id: Optional[str]) -> List[dict]:
+        params = {"limit": self.batch_size}
+        if after_sign and after_id:
+            params.update(after_sign=after_sign, after_id=after_id)
+        response = await self.prediction_bot.api.get("/internal/broadcast/recipients", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def send(self, chat_id: int, text: str):
+        """Отправка одного сообщения с повторами при 429 и сетевых ошибках"""
+        bot = self.prediction_bot.application.bot
+        for attempt in range(1, BROADCAST_MAX_ATTEMPTS + 1):
+            await self.limiter.acquire(chat_id)
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode='Markdown')
+                self.stats.sent += 1
+                return
+            except RetryAfter as e:
+                # Telegram просит подождать: тормозим всю рассылку, не только этот чат
+                self.stats.rate_limited += 1
+                retry_after = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+                self.limiter.global_bucket.pause(retry_after)
+            except Forbidden:
+                # Пользователь заблокировал бота
+                self.stats.blocked += 1
+                return
+            except BadRequest as e:
+                logger.warning(f"Broadcast to {chat_id} rejected: {e}")
+                self.stats.failed += 1
+                return
+            except NetworkError as e:
+                logger.warning(f"Broadcast to {chat_id} failed (attempt {attempt}): {e}")
+            if attempt < BROADCAST_MAX_ATTEMPTS:
+                self.stats.retried += 1
+        self.stats.failed += 1
+
+    async def run(self, day: Optional[date] = None, reset: bool = False) -> dict:
+        """Рассылка за день; повторный запуск продолжает с сохраненного курсора"""
+        day = day or datetime.utcnow().date()
+        checkpoint = BroadcastCheckpoint(day=day.isoformat()) if reset else \
+            BroadcastCheckpoint.load(self.checkpoint_path, day)
+        if checkpoint.done:
+            logger.info(f"Broadcast for {day} already completed")
+            return self.stats.snapshot()
+
+        self.stats = BroadcastStats()
+        texts = await self.fetch_texts(day)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send_limited(recipient: dict):
+            async with semaphore:
+                await self.send(recipient['telegram_id'], texts[recipient['zodiac_sign']])
+
+        log_task = asyncio.create_task(self._log_progress()) if BROADCAST_LOG_INTERVAL > 0 else None
+        next_batch = None
+        try:
+            next_batch = asyncio.create_task(self.fetch_recipients(checkpoint.after_sign, checkpoint.after_id))
+            while True:
+                batch = await next_batch
+                if not batch:
+                    break
+                last = batch[-1]
+                # Следующая пачка читается, пока отправляется текущая
+                next_batch = asyncio.create_task(self.fetch_recipients(last['zodiac_sign'], last['id']))
+
+                sent, failed, blocked = self.stats.sent, self.stats.failed, self.stats.blocked
+                await asyncio.gather(*(send_limited(recipient) for recipient in batch))
+
+                checkpoint.after_sign, checkpoint.after_id = last['zodiac_sign'], last['id']
+                checkpoint.sent += self.stats.sent - sent
+                checkpoint.failed += self.stats.failed - failed
+                checkpoint.blocked += self.stats.blocked - blocked
+                checkpoint.save(self.checkpoint_path)
+
+            checkpoint.done = True
+            checkpoint.save(self.checkpoint_path)
+        finally:
+            if log_task:
+                log_task.cancel()
+            if next_batch and not next_batch.done():
+                next_batch.cancel()
+
+        logger.info(f"Broadcast for {day} completed: {self.stats.snapshot()}")
+        return self.stats.snapshot()
+
+    async def _log_progress(self):
+        while True:
+            await asyncio.sleep(BROADCAST_LOG_INTERVAL)
+            logger.info(f"Broadcast progress: {self.stats.snapshot()}")
+
+def seconds_until(at: str) -> float:
+    """Секунды до ближайшего ЧЧ:ММ по UTC"""
+    hours, minutes = map(int, at.split(':'))
+    now = datetime.utcnow()
+    target = now.replace(hour=hours, minute=minutes, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+async def run_daily_broadcast(prediction_bot, at: str):
+    """Рассылка каждый день в at (ЧЧ:ММ по UTC)"""
+    broadcaster = Broadcaster(prediction_bot)
+    while True:
+        await asyncio.sleep(seconds_until(at))
+        try:
+            await broadcaster.run()
+        except Exception as e:
+            logger.error(f"Error in daily broadcast: {e}")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Рассылка предсказаний подписчикам")
+    parser.add_argument("--reset", action="store_true", help="начать заново, игнорируя прогресс")
+    args = parser.parse_args()
+
+    from main import PredictionBot
+
+    prediction_bot = PredictionBot()
+    await prediction_bot.open_api_client()
+    await prediction_bot.application.initialize()
+    try:
+        await Broadcaster(prediction_bot).run(reset=args.reset)
+    finally:
+        await prediction_bot.application.shutdown()
+        await prediction_bot.close_api_client()
+
+if __name__ == '__main__':
+    asyncio.run(main())
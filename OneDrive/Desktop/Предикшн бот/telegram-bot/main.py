@@ -1,4 +1,5 @@
 import asyncio
+import importlib.util
 import logging
 import os
 from datetime import datetime
@@ -8,6 +9,9 @@ from telegram import Update, WebAppInfo, InlineKeyboardButton, InlineKeyboardMar
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, PreCheckoutQueryHandler, filters, ContextTypes
 import httpx
 
+from scheduler import PerUserUpdateProcessor, log_scheduler_stats
+from metrics import BackendCallMetrics, InstrumentedTransport, log_backend_metrics
+
 # Настройка логирования
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -20,10 +24,60 @@ BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 WEBAPP_URL = os.getenv('WEBAPP_URL', 'https://your-webapp-url.com')
 API_BASE_URL = os.getenv('API_BASE_URL', 'http://localhost:8000')
 PAYMENT_PROVIDER_TOKEN = os.getenv('TELEGRAM_PAYMENT_PROVIDER_TOKEN')
+WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL')
+# Адрес Bot API, например http://127.0.0.1:8081/bot для локального фейкового сервера
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL')
+
+# Настройки HTTP-клиента для backend
+API_TIMEOUT = float(os.getenv('API_TIMEOUT', '10'))
+API_CONNECT_TIMEOUT = float(os.getenv('API_CONNECT_TIMEOUT', '3'))
+API_MAX_CONNECTIONS = int(os.getenv('API_MAX_CONNECTIONS', '100'))
+API_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('API_MAX_KEEPALIVE_CONNECTIONS', '20'))
+API_KEEPALIVE_EXPIRY = float(os.getenv('API_KEEPALIVE_EXPIRY', '30'))
+API_HTTP2 = os.getenv('API_HTTP2', 'true').lower() == 'true'
+INTERNAL_API_TOKEN = os.getenv('INTERNAL_API_TOKEN', '')
+
+# Попытки подтверждения платежа при сетевых ошибках
+CONFIRM_PAYMENT_ATTEMPTS = int(os.getenv('CONFIRM_PAYMENT_ATTEMPTS', '3'))
+
+# Параллельная обработка обновлений
+BOT_MAX_CONCURRENT_UPDATES = int(os.getenv('BOT_MAX_CONCURRENT_UPDATES', '32'))
+BOT_STATS_LOG_INTERVAL = float(os.getenv('BOT_STATS_LOG_INTERVAL', '60'))  # 0 - не логировать
+
+# Время ежедневной рассылки (ЧЧ:ММ по UTC); остальные настройки - в broadcast.py
+BROADCAST_TIME = os.getenv('BROADCAST_TIME')
+
+# Метрики вызовов backend (см. metrics.py)
+backend_metrics = BackendCallMetrics()
+
+def create_api_client() -> httpx.AsyncClient:
+    """Долгоживущий клиент backend с пулом keep-alive соединений"""
+    transport = httpx.AsyncHTTPTransport(
+        # HTTP/2 включается, только если установлен пакет h2
+        http2=API_HTTP2 and importlib.util.find_spec('h2') is not None,
+        limits=httpx.Limits(
+            max_connections=API_MAX_CONNECTIONS,
+            max_keepalive_connections=API_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=API_KEEPALIVE_EXPIRY
+        )
+    )
+    return httpx.AsyncClient(
+        base_url=API_BASE_URL,
+        headers={"X-Internal-Token": INTERNAL_API_TOKEN},
+        transport=InstrumentedTransport(transport, backend_metrics),
+        timeout=httpx.Timeout(API_TIMEOUT, connect=API_CONNECT_TIMEOUT)
+    )
 
 class PredictionBot:
     def __init__(self):
-        self.application = Application.builder().token(BOT_TOKEN).build()
+        self.update_processor = PerUserUpdateProcessor(BOT_MAX_CONCURRENT_UPDATES)
+        builder = Application.builder().token(BOT_TOKEN).concurrent_updates(self.update_processor)
+        if TELEGRAM_API_BASE_URL:
+            builder = builder.base_url(TELEGRAM_API_BASE_URL)
+        self.application = builder.build()
+        self.api: Optional[httpx.AsyncClient] = None
+        # Последний ответ рейтинга: (ETag, данные) для условного GET
+        self._rankings_cache: Optional[tuple] = None
         self.setup_handlers()
     
     def setup_handlers(self):
@@ -202,25 +256,25 @@ class PredictionBot:
         """Обработка запроса предсказания"""
         user_id = update.effective_user.id
         
-        # Проверяем, можно ли купить предсказание
-        can_purchase = await self.check_can_purchase(user_id)
+        # Проверка лимита, профиля и создание платежа - один запрос к backend
+        purchase = await self.start_purchase(user_id)
+        if not purchase:
+            await update.effective_message.reply_text("❌ Ошибка создания платежа.")
+            return
         
-        if not can_purchase['can_purchase']:
-            reason = can_purchase.get('reason', 'unknown')
-            if reason == 'already_purchased_today':
-                next_available = can_purchase.get('next_available_in_seconds', 0)
-                hours = next_available // 3600
-                minutes = (next_available % 3600) // 60
-                
-                message = f"⏰ Вы уже получили предсказание сегодня!\n\n"
-                message += f"Следующее предсказание будет доступно через: {hours}ч {minutes}м"
-                
-                await update.effective_message.reply_text(message)
-                return
+        if purchase['status'] == 'already_purchased_today':
+            next_available = purchase.get('next_available_in_seconds', 0)
+            hours = next_available // 3600
+            minutes = (next_available % 3600) // 60
+            
+            message = f"⏰ Вы уже получили предсказание сегодня!\n\n"
+            message += f"Следующее предсказание будет доступно через: {hours}ч {minutes}м"
+            
+            await update.effective_message.reply_text(message)
+            return
         
         # Проверяем знак зодиака
-        user_data = await self.get_user_data(user_id)
-        if not user_data or not user_data.get('zodiac_sign'):
+        if purchase['status'] == 'zodiac_sign_required':
             message = """
 ❗️ Сначала выберите свой знак зодиака в профиле!
 
@@ -235,14 +289,8 @@ class PredictionBot:
             await update.effective_message.reply_text(message, reply_markup=reply_markup)
             return
         
-        # Создаем платеж
-        payment_data = await self.create_payment(user_id)
-        if not payment_data:
-            await update.effective_message.reply_text("❌ Ошибка создания платежа.")
-            return
-        
         # Отправляем инвойс
-        await self.send_invoice(update, context, payment_data['payment_id'])
+        await self.send_invoice(update, context, purchase['payment']['payment_id'])
 
     async def send_invoice(self, update: Update, context: ContextTypes.DEFAULT_TYPE, payment_id: str):
         """Отправка инвойса для оплаты в XTR Stars"""
@@ -282,9 +330,9 @@ class PredictionBot:
         payment_id = query.invoice_payload.replace("prediction_payment_", "")
         
         # Проверяем существование платежа
-        payment_exists = await self.verify_payment(payment_id)
+        payment_exists = await self.verify_payment(query.from_user.id, payment_id)
         if not payment_exists:
-            await query.answer(ok=False, error_message="Платеж не найден")
+            await query.answer(ok=False, error_message="Счет не найден или устарел, запросите новый")
             return
         
         await query.answer(ok=True)
@@ -296,12 +344,13 @@ class PredictionBot:
         # Извлекаем payment_id из payload
         payment_id = payment.invoice_payload.replace("prediction_payment_", "")
         
-        # Подтверждаем платеж на backend
-        success = await self.confirm_payment(payment_id, payment.telegram_payment_charge_id)
+        # Подтверждаем платеж на backend - в ответе сразу приходит предсказание
+        confirmation = await self.confirm_payment(
+            update.effective_user.id, payment_id, payment.telegram_payment_charge_id
+        )
         
-        if success:
-            # Получаем предсказание
-            prediction = await self.get_today_prediction(update.effective_user.id)
+        if confirmation:
+            prediction = confirmation.get('prediction')
             
             if prediction:
                 prediction_text = f"""
@@ -327,104 +376,109 @@ _Следующее предсказание будет доступно зав
         logger.error(f"Update {update} caused error {context.error}")
 
     # API методы для взаимодействия с backend
+    async def open_api_client(self):
+        """Открытие общего HTTP-клиента backend"""
+        if self.api is None:
+            self.api = create_api_client()
+
+    async def close_api_client(self):
+        """Закрытие общего HTTP-клиента backend"""
+        if self.api is not None:
+            await self.api.aclose()
+            self.api = None
+
     async def register_user(self, user):
         """Регистрация пользователя"""
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(f"{API_BASE_URL}/users/", json={
-                    "telegram_id": user.id,
-                    "first_name": user.first_name,
-                    "zodiac_sign": None
-                })
-                return response.status_code == 201
-            except Exception as e:
-                logger.error(f"Error registering user: {e}")
-                return False
+        try:
+            response = await self.api.post("/users/", json={
+                "telegram_id": user.id,
+                "first_name": user.first_name,
+                "zodiac_sign": None
+            })
+            return response.status_code == 201
+        except Exception as e:
+            logger.error(f"Error registering user: {e}")
+            return False
 
     async def get_user_data(self, user_id: int):
         """Получение данных пользователя"""
-        async with httpx.AsyncClient() as client:
-            try:
-                # Здесь нужна аутентификация по Telegram ID
-                response = await client.get(f"{API_BASE_URL}/users/by-telegram-id/{user_id}")
-                if response.status_code == 200:
-                    return response.json()
-                return None
-            except Exception as e:
-                logger.error(f"Error getting user data: {e}")
-                return None
-
-    async def check_can_purchase(self, user_id: int):
-        """Проверка возможности покупки"""
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(f"{API_BASE_URL}/predictions/can-purchase", 
-                                          headers={"X-Telegram-User-ID": str(user_id)})
-                if response.status_code == 200:
-                    return response.json()
-                return {"can_purchase": False}
-            except Exception as e:
-                logger.error(f"Error checking purchase: {e}")
-                return {"can_purchase": False}
-
-    async def create_payment(self, user_id: int):
-        """Создание платежа"""
-        async with httpx.AsyncClient() as client:
+        try:
+            # Здесь нужна аутентификация по Telegram ID
+            response = await self.api.get(f"/users/by-telegram-id/{user_id}")
+            if response.status_code == 200:
+                return response.json()
+            return None
+        except Exception as e:
+            logger.error(f"Error getting user data: {e}")
+            return None
+
+    async def start_purchase(self, user_id: int):
+        """Проверка лимита и профиля с созданием платежа за один запрос"""
+        try:
+            response = await self.api.post(f"/internal/telegram/{user_id}/purchase")
+            if response.status_code == 200:
+                return response.json()
+            return None
+        except Exception as e:
+            logger.error(f"Error starting purchase: {e}")
+            return None
+
+    async def verify_payment(self, user_id: int, payment_id: str):
+        """Проверка, что платеж существует и еще ожидает оплаты"""
+        try:
+            # Telegram ждет ответа на pre_checkout_query не дольше 10 секунд
+            response = await self.api.get(f"/internal/telegram/{user_id}/payments/{payment_id}", timeout=5)
+            # Истекшие инвойсы backend переводит в failed
+            return response.status_code == 200 and response.json().get('status') == 'pending'
+        except Exception as e:
+            logger.error(f"Error verifying payment: {e}")
+            return False
+
+    async def confirm_payment(self, user_id: int, payment_id: str, telegram_charge_id: str):
+        """Подтверждение платежа, возвращает ответ backend с предсказанием.
+
+        Подтверждение идемпотентно по telegram_charge_id, поэтому при сетевых
+        ошибках и 5xx запрос повторяется: повтор вернет то же предсказание.
+        """
+        for attempt in range(1, CONFIRM_PAYMENT_ATTEMPTS + 1):
             try:
-                response = await client.post(f"{API_BASE_URL}/payments/create-invoice",
-                                           headers={"X-Telegram-User-ID": str(user_id)})
+                # Деньги уже списаны - даем backend больше времени
+                response = await self.api.post(f"/internal/telegram/{user_id}/payments/{payment_id}/confirm",
+                                               json={"telegram_payment_charge_id": telegram_charge_id},
+                                               timeout=30)
                 if response.status_code == 200:
                     return response.json()
-                return None
-            except Exception as e:
-                logger.error(f"Error creating payment: {e}")
-                return None
-
-    async def verify_payment(self, payment_id: str):
-        """Проверка существования платежа"""
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(f"{API_BASE_URL}/payments/{payment_id}")
-                return response.status_code == 200
-            except Exception as e:
-                logger.error(f"Error verifying payment: {e}")
-                return False
-
-    async def confirm_payment(self, payment_id: str, telegram_charge_id: str):
-        """Подтверждение платежа"""
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(f"{API_BASE_URL}/payments/{payment_id}/confirm", 
-                                           json={"telegram_payment_charge_id": telegram_charge_id})
-                return response.status_code == 200
+                if response.status_code < 500:
+                    logger.error(f"Payment {payment_id} not confirmed: {response.status_code} {response.text}")
+                    return None
+                logger.warning(f"Error confirming payment {payment_id}: HTTP {response.status_code}")
+            except httpx.TransportError as e:
+                logger.warning(f"Error confirming payment {payment_id}: {e}")
             except Exception as e:
                 logger.error(f"Error confirming payment: {e}")
-                return False
-
-    async def get_today_prediction(self, user_id: int):
-        """Получение предсказания на сегодня"""
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(f"{API_BASE_URL}/predictions/today",
-                                          headers={"X-Telegram-User-ID": str(user_id)})
-                if response.status_code == 200:
-                    return response.json()
-                return None
-            except Exception as e:
-                logger.error(f"Error getting prediction: {e}")
                 return None
+            if attempt < CONFIRM_PAYMENT_ATTEMPTS:
+                await asyncio.sleep(attempt)
+        return None
 
     async def get_rankings(self):
-        """Получение рейтинга"""
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(f"{API_BASE_URL}/users/rankings")
-                if response.status_code == 200:
-                    return response.json()
-                return []
-            except Exception as e:
-                logger.error(f"Error getting rankings: {e}")
-                return []
+        """Получение рейтинга; без изменений backend отвечает 304 без тела"""
+        headers = {}
+        if self._rankings_cache:
+            headers["If-None-Match"] = self._rankings_cache[0]
+        try:
+            response = await self.api.get("/users/rankings", headers=headers)
+            if response.status_code == 304 and self._rankings_cache:
+                return self._rankings_cache[1]
+            if response.status_code == 200:
+                rankings = response.json()
+                etag = response.headers.get("ETag")
+                self._rankings_cache = (etag, rankings) if etag else None
+                return rankings
+            return []
+        except Exception as e:
+            logger.error(f"Error getting rankings: {e}")
+            return []
 
     def get_zodiac_emoji(self, sign):
         """Получение эмодзи знака зодиака"""
@@ -447,18 +501,35 @@ _Следующее предсказание будет доступно зав
     async def run(self):
         """Запуск бота"""
         logger.info("Starting Prediction Bot...")
+        await self.open_api_client()
         await self.application.initialize()
         await self.application.start()
         await self.application.updater.start_polling()
+        stats_tasks = []
+        if BOT_STATS_LOG_INTERVAL > 0:
+            stats_tasks = [
+                asyncio.create_task(log_scheduler_stats(self.update_processor, BOT_STATS_LOG_INTERVAL)),
+                asyncio.create_task(log_backend_metrics(backend_metrics, BOT_STATS_LOG_INTERVAL))
+            ]
+        broadcast_task = None
+        if BROADCAST_TIME:
+            # Ежедневная рассылка подписчикам
+            from broadcast import run_daily_broadcast
+            broadcast_task = asyncio.create_task(run_daily_broadcast(self, BROADCAST_TIME))
         
         try:
             await asyncio.Future()  # Ждем бесконечно
         except KeyboardInterrupt:
             logger.info("Stopping bot...")
         finally:
+            for task in stats_tasks:
+                task.cancel()
+            if broadcast_task:
+                broadcast_task.cancel()
             await self.application.updater.stop()
             await self.application.stop()
             await self.application.shutdown()
+            await self.close_api_client()
 
 def main():
     """Главная функция"""
@@ -466,6 +537,12 @@ def main():
         logger.error("TELEGRAM_BOT_TOKEN не установлен")
         return
     
+    if WEBHOOK_URL:
+        # Webhook-режим: обновления приходят через ASGI-приложение
+        from webhook import run_webhook
+        run_webhook()
+        return
+    
     bot = PredictionBot()
     asyncio.run(bot.run())
 
@@ -0,0 +1,124 @@
+"""Метрики вызовов backend из бота в формате Prometheus.
+
+Каждый запрос общего httpx-клиента проходит через InstrumentedTransport:
+считаются вызовы по шаблону пути и статусу (или типу сетевой ошибки),
+время до ответа и запросы в полете. В webhook-режиме метрики отдаются
+на GET /metrics, в режиме polling пишутся в лог.
+"""
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = b"text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+# Telegram ID и UUID в пути заменяются на {id}, чтобы число меток было ограничено
+_ID_SEGMENT = re.compile(r"/(?:\d+|[0-9a-fA-F]{8}-[0-9a-fA-F-]{27})(?=/|$)")
+
+def normalize_path(path: str) -> str:
+    return _ID_SEGMENT.sub("/{id}", path)
+
+def _bucket_label(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+class BackendCallMetrics:
+    """Количество, исходы и задержки вызовов backend"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.calls: Dict[Tuple[str, str], int] = {}
+        # вызов -> (счетчики по корзинам, сумма секунд, количество)
+        self.latency: Dict[str, list] = {}
+
+    def observe(self, call: str, outcome: str, seconds: float):
+        self.calls[(call, outcome)] = self.calls.get((call, outcome), 0) + 1
+        state = self.latency.get(call)
+        if state is None:
+            state = self.latency[call] = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                state[0][i] += 1
+                break
+        state[1] += seconds
+        state[2] += 1
+
+    def snapshot(self) -> dict:
+        """Сводка для лога: вызовы, ошибки (5xx и сетевые) и среднее время"""
+        result = {}
+        for call, (_, total, count) in self.latency.items():
+            errors = sum(
+                value for (name, outcome), value in self.calls.items()
+                if name == call and not (outcome.isdigit() and int(outcome) < 500)
+            )
+            result[call] = {"calls": count, "errors": errors, "avg_ms": round(total / count * 1000, 2)}
+        return result
+
+    def render(self) -> List[str]:
+        lines = [
+            "# HELP bot_backend_requests_in_flight Backend requests being sent",
+            "# TYPE bot_backend_requests_in_flight gauge",
+            f"bot_backend_requests_in_flight {self.in_flight}",
+            "# HELP bot_backend_requests_total Backend requests by call and status or error type",
+            "# TYPE bot_backend_requests_total counter",
+        ]
+        for (call, outcome), value in self.calls.items():
+            lines.append(f'bot_backend_requests_total{{call="{call}",outcome="{outcome}"}} {value}')
+        lines += [
+            "# HELP bot_backend_request_duration_seconds Time until backend response headers",
+            "# TYPE bot_backend_request_duration_seconds histogram",
+        ]
+        for call, (counts, total, count) in self.latency.items():
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(
+                    f'bot_backend_request_duration_seconds_bucket{{call="{call}",le="{_bucket_label(bound)}"}} {cumulative}'
+                )
+            lines.append(f'bot_backend_request_duration_seconds_sum{{call="{call}"}} {total!r}')
+            lines.append(f'bot_backend_request_duration_seconds_count{{call="{call}"}} {count}')
+        return lines
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Транспорт httpx, записывающий метрики каждого запроса"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, metrics: BackendCallMetrics):
+        self._transport = transport
+        self._metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        call = f"{request.method} {normalize_path(request.url.path)}"
+        self._metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception as e:
+            self._metrics.observe(call, type(e).__name__, time.perf_counter() - started)
+            raise
+        finally:
+            self._metrics.in_flight -= 1
+        self._metrics.observe(call, str(response.status_code), time.perf_counter() - started)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+def render_bot_metrics(backend: BackendCallMetrics, scheduler_stats: dict, extra: Dict[str, float] = None) -> bytes:
+    """Метрики бота: вызовы backend, планировщик обновлений и дополнительные gauge"""
+    lines = backend.render()
+    gauges = {f"bot_updates_{name}": value for name, value in scheduler_stats.items()}
+    gauges.update(extra or {})
+    for name, value in gauges.items():
+        lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    return ("\n".join(lines) + "\n").encode()
+
+async def log_backend_metrics(metrics: BackendCallMetrics, interval_seconds: float):
+    """Периодическая запись метрик вызовов backend в лог"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        logger.info(f"Backend calls: {metrics.snapshot()}")
@@ -0,0 +1,124 @@
+"""Планировщик обновлений: параллельно для разных пользователей, по порядку для одного."""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# Потолок для семафора PTB: реальное ограничение параллельности - в самом планировщике,
+# чтобы обновления, ждущие своей очереди у пользователя, не занимали слоты
+MAX_PENDING_UPDATES = 100_000
+
+class _UserQueue:
+    __slots__ = ("lock", "depth")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.depth = 0
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Обработка обновлений разных пользователей параллельно.
+
+    Обновления одного пользователя (или чата) выполняются строго в порядке
+    поступления: asyncio.Lock выдает доступ ожидающим по очереди. Это важно
+    для pre_checkout_query и successful_payment по одному инвойсу.
+    Общее число одновременно выполняемых обработчиков ограничено concurrency.
+    """
+
+    def __init__(self, concurrency: int):
+        super().__init__(MAX_PENDING_UPDATES)
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency)
+        self._queues: Dict[int, _UserQueue] = {}
+        self.pending = 0
+        self.active = 0
+        self.max_pending = 0
+        self.max_user_depth = 0
+        self.processed = 0
+        self.failed = 0
+        self.wait_seconds_total = 0.0
+
+    @staticmethod
+    def update_key(update: object) -> Optional[int]:
+        """Ключ упорядочивания: пользователь, иначе чат"""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self.update_key(update)
+        queue = None
+        if key is not None:
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = _UserQueue()
+            queue.depth += 1
+            self.max_user_depth = max(self.max_user_depth, queue.depth)
+
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        started = time.perf_counter()
+        waiting = True
+        try:
+            if queue is not None:
+                await queue.lock.acquire()
+            try:
+                async with self._slots:
+                    waiting = False
+                    self.pending -= 1
+                    self.wait_seconds_total += time.perf_counter() - started
+                    self.active += 1
+                    try:
+                        await coroutine
+                        self.processed += 1
+                    except Exception:
+                        self.failed += 1
+                        raise
+                    finally:
+                        self.active -= 1
+            finally:
+                if queue is not None:
+                    queue.lock.release()
+        finally:
+            if waiting:
+                # Отмена до начала обработки
+                self.pending -= 1
+            if queue is not None:
+                queue.depth -= 1
+                if queue.depth == 0:
+                    del self._queues[key]
+
+    def stats(self) -> dict:
+        """Метрики очереди обновлений"""
+        started = self.processed + self.failed
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "users_in_flight": len(self._queues),
+            "max_user_depth": self.max_user_depth,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_wait_seconds": round(self.wait_seconds_total / started, 6) if started else 0.0
+        }
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+async def log_scheduler_stats(processor: PerUserUpdateProcessor, interval_seconds: float):
+    """Периодическая запись метрик планировщика в лог"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        logger.info(f"Update scheduler: {processor.stats()}")
@@ -0,0 +1,214 @@
+"""Webhook-режим бота: ASGI-приложение, принимающее обновления Telegram.
+
+Запуск отдельно:
+    uvicorn webhook:app --host 0.0.0.0 --port 8080
+
+Или рядом с FastAPI backend (lifespan вложенных приложений не вызывается,
+поэтому start/stop нужно дернуть из lifespan основного приложения):
+    webhook_app = WebhookApp(path=None)
+    app.mount("/telegram/webhook", webhook_app)
+    # в lifespan: await webhook_app.start() ... await webhook_app.stop()
+
+Каждая реплика принимает обновления независимо, поэтому их можно держать
+несколько за балансировщиком; setWebhook идемпотентен.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+from typing import Optional, Set
+
+from telegram import Update
+
+from main import PredictionBot, backend_metrics
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_bot_metrics
+
+logger = logging.getLogger(__name__)
+
+# Настройки webhook
+WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN')
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))  # принятых, но не обработанных обновлений
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+WEBHOOK_SET_ON_START = os.getenv('WEBHOOK_SET_ON_START', 'true').lower() == 'true'
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_METRICS_PATH = os.getenv('WEBHOOK_METRICS_PATH', '/metrics')  # пусто - не отдавать метрики
+
+class WebhookApp:
+    """ASGI-приложение: каждое обновление - отдельная задача, как в polling PTB.
+
+    Параллельность обработчиков ограничивает семафор планировщика бота
+    (BOT_MAX_CONCURRENT_UPDATES), а не число задач: обновления, ждущие
+    своей очереди у пользователя, слоты не занимают. Число принятых, но
+    не обработанных обновлений ограничено queue_size.
+    """
+
+    def __init__(
+        self,
+        bot: Optional[PredictionBot] = None,
+        path: Optional[str] = WEBHOOK_PATH,
+        secret_token: Optional[str] = WEBHOOK_SECRET_TOKEN,
+        queue_size: int = WEBHOOK_QUEUE_SIZE
+    ):
+        self.bot = bot
+        self.path = path.rstrip('/') if path else None
+        self.secret_token = secret_token
+        self.queue_size = queue_size
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start(self, set_webhook: bool = WEBHOOK_SET_ON_START):
+        """Инициализация бота и регистрация webhook"""
+        if self.bot is None:
+            self.bot = PredictionBot()
+        application = self.bot.application
+
+        await self.bot.open_api_client()
+        await application.initialize()
+        await application.start()
+
+        if set_webhook and WEBHOOK_URL:
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL,
+                secret_token=self.secret_token,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=WEBHOOK_MAX_CONNECTIONS
+            )
+            logger.info(f"Webhook set to {WEBHOOK_URL}")
+
+    async def stop(self, drain_timeout: float = 10):
+        """Дообработка принятых обновлений и остановка бота"""
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=drain_timeout)
+            if pending:
+                logger.warning(f"Webhook updates not drained, {len(pending)} updates dropped")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        application = self.bot.application
+        await application.stop()
+        await application.shutdown()
+        await self.bot.close_api_client()
+
+    @property
+    def in_flight(self) -> int:
+        """Принятые обновления, которые еще обрабатываются или ждут очереди"""
+        return len(self._tasks)
+
+    def _dispatch(self, update: Update):
+        """Запуск обработки обновления отдельной задачей.
+
+        Задачи создаются в порядке поступления, а планировщик бота выдает
+        блокировку пользователя по очереди, поэтому обновления одного
+        пользователя сохраняют порядок.
+        """
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, update: Update):
+        application = self.bot.application
+        try:
+            await application.update_processor.process_update(
+                update, application.process_update(update)
+            )
+        except Exception as e:
+            logger.error(f"Error processing update {update.update_id}: {e}")
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._handle_lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        if WEBHOOK_METRICS_PATH and scope['path'] == WEBHOOK_METRICS_PATH and scope['method'] == 'GET':
+            await self._respond_metrics(send)
+            return
+        if self.path and scope['path'].rstrip('/') != self.path:
+            await self._respond(send, 404)
+            return
+        if scope['method'] != 'POST':
+            await self._respond(send, 405)
+            return
+
+        if self.secret_token:
+            headers = dict(scope['headers'])
+            received = headers.get(b'x-telegram-bot-api-secret-token', b'').decode()
+            if not hmac.compare_digest(received, self.secret_token):
+                await self._respond(send, 403)
+                return
+
+        body = await self._read_body(receive)
+        try:
+            update = Update.de_json(json.loads(body), self.bot.application.bot)
+        except (ValueError, TypeError) as e:
+            logger.error(f"Bad webhook payload: {e}")
+            await self._respond(send, 400)
+            return
+
+        if self.in_flight >= self.queue_size:
+            # Telegram повторит доставку позже
+            await self._respond(send, 503)
+            return
+
+        self._dispatch(update)
+        await self._respond(send, 200)
+
+    async def _handle_lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.start()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        return body
+
+    async def _respond_metrics(self, send):
+        body = render_bot_metrics(
+            backend_metrics,
+            self.bot.update_processor.stats() if self.bot else {},
+            {"bot_webhook_queue_size": self.in_flight, "bot_webhook_queue_capacity": self.queue_size}
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', METRICS_CONTENT_TYPE), (b'content-length', str(len(body)).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def _respond(send, status: int):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain'), (b'content-length', b'0')]
+        })
+        await send({'type': 'http.response.body', 'body': b''})
+
+app = WebhookApp()
+
+def run_webhook():
+    """Запуск webhook-сервера"""
+    import uvicorn
+
+    uvicorn.run(app, host=WEBHOOK_HOST, port=WEBHOOK_PORT)